@@ -1,9 +1,28 @@
 import os
+import atexit
+import asyncio
+import queue
+import re
+import signal
+import sys
+import time
 import logging
-import threading
-import html
-from flask import Flask
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
+import logging.handlers
+import hmac
+import httpx
+import orjson
+try:
+    import uvloop
+except ImportError:
+    # uvloop has no Windows build; fall back to the default asyncio loop
+    uvloop = None
+from aiohttp import web
+from telegram import (
+    Message,
+    Update,
+    InlineKeyboardButton,
+    InlineKeyboardMarkup
+)
 from telegram.ext import (
     Application,
     CommandHandler,
@@ -11,74 +30,311 @@ from telegram.ext import (
     filters,
     ContextTypes,
     CallbackQueryHandler,
-    MessageReactionHandler
+    MessageReactionHandler,
+    BaseUpdateProcessor,
+    AIORateLimiter
 )
-from pymongo import MongoClient
-from datetime import datetime, timezone
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
+from cachetools import TTLCache
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, WriteConcern
+from pymongo.errors import BulkWriteError
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
 
 # Configuration
-TOKEN = os.getenv("TOKEN")
-OWNER_ID = os.getenv("OWNER_ID", "OWNER_IDD")
-MONGO_URI = os.getenv("MONGO_URI", "mongodb://localhost:27017/")
-if not TOKEN:
-    raise ValueError("Missing TOKEN environment variable")
-if not OWNER_ID:
-    raise ValueError("Missing OWNER_ID environment variable")
-
-# Enable logging
-logging.basicConfig(
-    format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
-    level=logging.INFO
-)
+@dataclass(frozen=True, slots=True)
+class Config:
+    """Settings read from the environment once at startup"""
+    token: str
+    owner_id: int
+    mongo_uri: str
+    port: int
+    # Public base URL (e.g. https://my-bot.onrender.com); enables webhook mode when set
+    webhook_url: str
+    # Telegram echoes this in every webhook request so forged updates can be rejected
+    webhook_secret: str
+
+def load_config() -> Config:
+    """Read and validate the environment"""
+    token = os.getenv("TOKEN")
+    owner_id = os.getenv("OWNER_ID")
+    if not token:
+        raise ValueError("Missing TOKEN environment variable")
+    if not owner_id:
+        raise ValueError("Missing OWNER_ID environment variable")
+    try:
+        owner_id = int(owner_id)
+    except ValueError:
+        raise ValueError("OWNER_ID must be a numeric Telegram user ID")
+    if owner_id <= 0:
+        # Negative ids are chats, not users - the owner filters would never match
+        raise ValueError("OWNER_ID must be a Telegram user ID, not a group or channel ID")
+    
+    return Config(
+        token=token,
+        owner_id=owner_id,
+        mongo_uri=os.getenv("MONGO_URI", "mongodb://localhost:27017/"),
+        port=int(os.getenv("PORT", "8000")),
+        webhook_url=os.getenv("WEBHOOK_URL", "").rstrip("/"),
+        webhook_secret=os.getenv("WEBHOOK_SECRET", "")
+    )
+
+CFG = load_config()
+
+# Enable logging - records are queued and written to stderr by a background thread,
+# so handlers on the event loop never block on log I/O
+log_queue = queue.SimpleQueue()
+log_stream_handler = logging.StreamHandler()
+log_stream_handler.setFormatter(logging.Formatter("%(asctime)s - %(name)s - %(levelname)s - %(message)s"))
+log_listener = logging.handlers.QueueListener(log_queue, log_stream_handler)
+logging.getLogger().addHandler(logging.handlers.QueueHandler(log_queue))
+logging.getLogger().setLevel(logging.INFO)
+# httpx logs every Bot API request at INFO; keep dependency chatter to warnings and up
+logging.getLogger("httpx").setLevel(logging.WARNING)
+logging.getLogger("pymongo").setLevel(logging.WARNING)
+log_listener.start()
+atexit.register(log_listener.stop)
 logger = logging.getLogger(__name__)
 
-# Create Flask app
-app = Flask(__name__)
+# MongoDB setup - Motor connects lazily on the running loop, so nothing blocks here.
+# minPoolSize keeps warm connections so the first command after boot skips the handshake,
+# and the timeouts make an unreachable server fail fast instead of stalling handlers
+client = AsyncIOMotorClient(
+    CFG.mongo_uri,
+    maxPoolSize=20,
+    minPoolSize=5,
+    serverSelectionTimeoutMS=3000,
+    connectTimeoutMS=3000,
+    socketTimeoutMS=5000,
+    retryWrites=True,
+    compressors="zstd,zlib"
+)
+db = client.telegram_bot
+# Connections are the bot's real state - wait for a majority to acknowledge them
+connections_collection = db.get_collection("connections", write_concern=WriteConcern(w="majority"))
+# Counters and routing caches are cheap to lose on failover, so a primary ack is enough
+FAST_WRITES = WriteConcern(w=1)
+stats_collection = db.get_collection("stats", write_concern=FAST_WRITES)
+# One running all-time totals document per owner, kept in step with the daily stats
+stats_totals_collection = db.get_collection("stats_totals", write_concern=FAST_WRITES)
+# Per-owner preferences such as /verbose
+settings_collection = db.settings
+# Reply-routing mappings, keyed by the forwarded message id, so replies keep working after a restart
+message_mappings_collection = db.get_collection("message_mappings", write_concern=FAST_WRITES)
+# Group-to-private, edit and reaction mappings, one document per in-memory entry
+mappings_collection = db.get_collection("mappings", write_concern=FAST_WRITES)
 
-# MongoDB setup
-try:
-    client = MongoClient(MONGO_URI)
-    db = client.telegram_bot
-    connections_collection = db.connections
-    stats_collection = db.stats
-    # Test connection
-    client.admin.command('ping')
-    logger.info("✅ MongoDB connection successful")
-except Exception as e:
-    logger.error(f"❌ MongoDB connection failed: {e}")
-    raise
-
-# Store message mappings for reply functionality
-message_mappings = {}
-# Store reaction mappings - track both directions
-reaction_mappings = {}
+# Telegram delivers each album item as a separate update; wait this long for the rest
+ALBUM_WAIT_SECONDS = 1.0
+# Reply, reaction and edit mappings kept in memory - the oldest are dropped
+# beyond MESSAGE_MAPPINGS_MAX, and any entry after a day
+MESSAGE_MAPPINGS_MAX = 10000
+MESSAGE_MAPPINGS_TTL = 60 * 60 * 24
+# A mapping MongoDB didn't have isn't looked up again for this long
+MISSING_MAPPING_TTL = 300
+# A group selection left untouched this long is dropped as "Message data expired"
+PENDING_MESSAGE_TTL = 600
+# Seconds a cached connections lookup is served before MongoDB is queried again
+CONNECTIONS_CACHE_TTL = 30.0
+# The owner's connections are reloaded in the background this often - under the TTL,
+# so handlers keep hitting a warm cache
+CONNECTIONS_REFRESH_SECONDS = 20.0
+# Seconds group info fetched for /stats is reused before asking Telegram again
+CHAT_INFO_TTL = 60
+# Daily stats documents are expired by MongoDB after this long; all-time totals live in stats_totals
+STATS_RETENTION_SECONDS = 60 * 60 * 24 * 365
+# Daily and all-time totals fields incremented for each stats action
+STATS_FIELDS = {
+    "message_sent": ("messages_sent", "total_messages"),
+    "connection_added": ("connections_added", "total_connections_added"),
+    "connection_removed": ("connections_removed", "total_connections_removed"),
+    "reply_handled": ("replies_handled", "total_replies"),
+    "reaction_handled": ("reactions_handled", "total_reactions"),
+    "edit_handled": ("edits_handled", "total_edits")
+}
+# Stats increments are buffered in memory and written at most this often
+STATS_FLUSH_SECONDS = 2.0
+# Queued mapping writes are sent to MongoDB this long after the first one arrives
+WRITES_FLUSH_SECONDS = 0.05
+# Maximum number of group sends in flight at the same time, across all updates
+FORWARD_CONCURRENCY = 10
+# Maximum number of group message edits in flight at the same time
+EDIT_CONCURRENCY = 10
+# Bounds in-flight group sends, to stay clear of Telegram's flood limits
+send_slots = asyncio.Semaphore(FORWARD_CONCURRENCY)
+# Edits get their own slots - an edit can sit in the rate limiter's per-group wait,
+# and a burst of them must not take the permits new sends need
+edit_slots = asyncio.Semaphore(EDIT_CONCURRENCY)
+
+# Media attributes probed in order to label a private message's preview: (Message attribute,
+# preview label, caption shown). document is probed before animation, which Telegram also fills in for GIFs
+MEDIA_TABLE = (
+    ("sticker", "🎨 Sticker", False),
+    ("photo", "🖼️ Photo", True),
+    ("video", "🎥 Video", True),
+    ("document", "📄 Document", True),
+    ("audio", "🎵 Audio", True),
+    ("voice", "🎤 Voice Message", False),
+    ("animation", "🎬 Animation", True)
+)
+
+# Reply texts, built once at import
+_START_TEXT = (
+    "🤖 Owner-Only Forward Bot is running!\n\n"
+    "🔧 Available Commands:\n"
+    "• /connect <group_id> - Connect to a group\n"
+    "• /disconnect [group_id] - Disconnect from group(s)\n"
+    "• /stats - Show all connected groups with details\n"
+    "• /botstats - Detailed bot statistics and analytics\n"
+    "• /verbose - Toggle confirmations for successful replies and edits\n\n"
+    "🔄 Features:\n"
+    "- Send messages and select specific groups to send to\n"
+    "- When someone replies to BOT'S messages in connected groups, I'll forward them to you\n"
+    "- When someone mentions/tags the bot in groups, I'll forward those messages to you\n"
+    "- Reply to those messages and I'll send your response back!\n"
+    "- Edit your messages and I'll update them in groups automatically\n"
+    "- React to messages and I'll mirror reactions in groups\n"
+    "- View detailed group statistics\n"
+    "- MongoDB database for reliable storage\n\n"
+    "⚠️ Note: Only you (the owner) can use this bot."
+)
+_CONNECTED_TEMPLATE = (
+    "✅ Connected to {type}: {name} (ID: {id})!\n\n"
+    "🔄 Features:\n"
+    "- Send any message and select groups to send to\n"
+    "- When someone replies to BOT'S messages in connected groups, I'll forward them to you\n"
+    "- When someone mentions/tags the bot in groups, I'll forward those messages to you\n"
+    "- Reply to those messages and I'll send your response back!\n"
+    "- Edit your messages and I'll update them in groups automatically\n"
+    "- React to messages and I'll mirror reactions in groups\n"
+    "- Use /stats to see all connected groups\n"
+    "- Use /disconnect <group_id> to remove a group\n"
+    "- Use /botstats for detailed statistics"
+)
+_SELECTION_TEMPLATE = (
+    "📤 **Select Groups to Send Message**\n\n"
+    "📍 **Message Preview:**\n"
+    "{preview}\n\n"
+    "✅ **Selected:** {count} group(s)\n"
+    "👇 Tap groups to select/deselect"
+)
+_NOT_CONNECTED_TEXT = "❌ You are not connected to any groups!"
+_CONNECT_FIRST_TEXT = "⚠️ You're not connected to any groups! Use /connect <group_id> first."
+_INVALID_GROUP_ID_TEXT = "Invalid group ID. Must be an integer."
+# Characters that would open a Markdown entity in a group name
+_MD_ESCAPE_TABLE = str.maketrans({'*': '\\*', '_': '\\_', '`': '\\`', '[': '\\['})
+
+# Store message mappings for reply functionality - a bounded cache in front of message_mappings_collection
+message_mappings = TTLCache(maxsize=MESSAGE_MAPPINGS_MAX, ttl=MESSAGE_MAPPINGS_TTL)
+# Store reaction mappings - track both directions. These three caches sit in front of mappings_collection
+reaction_mappings = TTLCache(maxsize=MESSAGE_MAPPINGS_MAX, ttl=MESSAGE_MAPPINGS_TTL)
 # Store group message to private message mappings
-group_to_private_mappings = {}
+group_to_private_mappings = TTLCache(maxsize=MESSAGE_MAPPINGS_MAX, ttl=MESSAGE_MAPPINGS_TTL)
 # Store active connections and group info
 active_groups = {}
 # Store pending messages for group selection
-pending_messages = {}
+pending_messages = TTLCache(maxsize=100, ttl=PENDING_MESSAGE_TTL)
 # Store edit mappings - track messages that can be edited
-edit_mappings = {}
+edit_mappings = TTLCache(maxsize=MESSAGE_MAPPINGS_MAX, ttl=MESSAGE_MAPPINGS_TTL)
+# Mapping keys MongoDB had no entry for, so reactions and edits on unmapped messages
+# don't query it on every event
+missing_mappings = TTLCache(maxsize=MESSAGE_MAPPINGS_MAX, ttl=MISSING_MAPPING_TTL)
+# Recently fetched group Chat objects, so repeated /stats calls don't refetch every group
+chat_info_cache = TTLCache(maxsize=1000, ttl=CHAT_INFO_TTL)
+# Whether successful replies and edits are confirmed with a message - failures always are.
+# Toggled by /verbose and loaded from settings_collection at startup
+verbose_confirmations = False
+# Store album messages until every item of the media group has arrived
+album_buffers = {}
+# (connections dict, keyboard) - the nothing-selected keyboard, reused until the connections
+# cache hands out a new dict. Cached connection dicts are never mutated, so identity is enough
+fresh_keyboard = (None, None)
+# Cache active connections per owner as (fetched_at, connections) - invalidated
+# whenever connections change, and refetched after CONNECTIONS_CACHE_TTL as a backstop
+connections_cache = {}
+# Serializes connection writes with cache fills so a fill can't store data a write just invalidated
+connections_lock = asyncio.Lock()
+# Stats increments not yet written, one buffer per collection so a failed write is retried
+# without re-applying the other: (owner_id, day) -> {daily_field: count}, owner_id -> {total_field: count}
+pending_daily_stats = {}
+pending_total_stats = {}
+# Set when the stats buffers gain increments, to wake the flusher
+stats_dirty = asyncio.Event()
+# Mapping writes waiting for the background writer: collection name -> (collection, [ops])
+pending_writes = {}
+# Set when pending_writes gains ops, to wake the writer
+writes_dirty = asyncio.Event()
+# Set at shutdown - the flush loops finish the write in flight and exit instead of being cancelled,
+# so a batch already swapped out of its buffer is never lost
+flushers_stopping = asyncio.Event()
 
-@app.route('/')
-def health_check():
-    return "🤖 Bot is running! Only the owner can use me.", 200
+class OrjsonRequest(HTTPXRequest):
+    """HTTPXRequest that parses Telegram's JSON responses with orjson"""
+    
+    __slots__ = ()
+    
+    @staticmethod
+    def parse_json_payload(payload: bytes) -> dict:
+        try:
+            return orjson.loads(payload)
+        except orjson.JSONDecodeError:
+            # Let PTB's lenient decoder handle (and log) malformed payloads
+            return HTTPXRequest.parse_json_payload(payload)
 
-def run_flask():
-    port = int(os.getenv("PORT", 8000))
-    logger.info(f"Starting Flask health check on port {port}")
-    app.run(host='0.0.0.0', port=port)
+class PerChatUpdateProcessor(BaseUpdateProcessor):
+    """Process updates from different chats concurrently, but each chat's updates in arrival order"""
+    
+    __slots__ = ("_chat_locks", "_slots")
+    
+    def __init__(self, max_concurrent_updates: int):
+        # PTB takes its own slot before do_process_update runs, which would let updates queued
+        # behind a busy chat hold every slot - so leave PTB's limit open and bound concurrency
+        # here, after the chat's turn comes
+        super().__init__(sys.maxsize)
+        self._slots = asyncio.Semaphore(max_concurrent_updates)
+        # chat_id -> [lock, updates holding or waiting for it]; dropped when the chat goes idle
+        self._chat_locks = {}
+    
+    async def do_process_update(self, update: object, coroutine) -> None:
+        chat = update.effective_chat if isinstance(update, Update) else None
+        if chat is None:
+            async with self._slots:
+                await coroutine
+            return
+        
+        entry = self._chat_locks.get(chat.id)
+        if entry is None:
+            entry = self._chat_locks[chat.id] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0], self._slots:
+                await coroutine
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat.id]
+    
+    async def initialize(self) -> None:
+        pass
+    
+    async def shutdown(self) -> None:
+        pass
 
-# Initialize Telegram application
-application = Application.builder().token(TOKEN).build()
+# Midnight UTC of the current day as (day number, datetime) - only rebuilt when the day changes
+_today_cache = (0, None)
 
-def is_owner(user_id: int) -> bool:
-    """Check if user is the owner"""
-    return str(user_id) == OWNER_ID
+def today_utc() -> datetime:
+    """Return today's date at midnight UTC, the key of the daily stats documents"""
+    global _today_cache
+    day = int(time.time()) // 86400
+    if day != _today_cache[0]:
+        _today_cache = (day, datetime.fromtimestamp(day * 86400, timezone.utc))
+    return _today_cache[1]
 
 # MongoDB Storage Functions
-def save_connection(owner_id: int, group_id: int, group_name: str, group_username: str = ""):
+async def save_connection(owner_id: int, group_id: int, group_name: str, group_username: str = "") -> None:
     """Save connection to MongoDB"""
     connection_data = {
         "owner_id": owner_id,
@@ -90,113 +346,302 @@ def save_connection(owner_id: int, group_id: int, group_name: str, group_usernam
     }
     
     # Update or insert
-    connections_collection.update_one(
-        {"owner_id": owner_id, "group_id": group_id},
-        {"$set": connection_data},
-        upsert=True
-    )
+    async with connections_lock:
+        await connections_collection.update_one(
+            {"owner_id": owner_id, "group_id": group_id},
+            {"$set": connection_data},
+            upsert=True
+        )
+        connections_cache.pop(owner_id, None)
     
-    # Update stats
     update_stats(owner_id, "connection_added")
 
-def remove_connection(owner_id: int, group_id: int):
+async def remove_connection(owner_id: int, group_id: int) -> bool:
     """Remove connection from MongoDB"""
-    result = connections_collection.update_one(
-        {"owner_id": owner_id, "group_id": group_id},
-        {"$set": {"is_active": False, "disconnected_at": datetime.now(timezone.utc)}}
-    )
+    async with connections_lock:
+        result = await connections_collection.update_one(
+            {"owner_id": owner_id, "group_id": group_id},
+            {"$set": {"is_active": False, "disconnected_at": datetime.now(timezone.utc)}}
+        )
+        connections_cache.pop(owner_id, None)
     
     if result.modified_count > 0:
         update_stats(owner_id, "connection_removed")
         return True
     return False
 
-def get_all_connections(owner_id: int):
+async def get_all_connections(owner_id: int) -> dict:
     """Get all active connections for owner"""
+    cached = connections_cache.get(owner_id)
+    if cached is not None and time.monotonic() - cached[0] < CONNECTIONS_CACHE_TTL:
+        return cached[1]
+    
+    async with connections_lock:
+        # Another handler may have filled the cache while this one waited
+        cached = connections_cache.get(owner_id)
+        if cached is not None and time.monotonic() - cached[0] < CONNECTIONS_CACHE_TTL:
+            return cached[1]
+        return await load_connections(owner_id)
+
+async def load_connections(owner_id: int) -> dict:
+    """Query the owner's active connections and cache them - callers hold connections_lock"""
     connections = {}
-    cursor = connections_collection.find({
-        "owner_id": owner_id,
-        "is_active": True
-    })
+    cursor = connections_collection.find(
+        {"owner_id": owner_id, "is_active": True},
+        {"_id": 0, "group_id": 1, "group_name": 1, "group_username": 1, "connected_at": 1}
+    )
     
-    for doc in cursor:
+    async for doc in cursor:
         connections[doc["group_id"]] = {
             "name": doc["group_name"],
             "username": doc.get("group_username", ""),
             "connected_at": doc.get("connected_at")
         }
     
+    # Keep the cached dict when nothing changed, so snapshots built from it (such as the
+    # group selection keyboard, cached by dict identity) survive the periodic refresh
+    cached = connections_cache.get(owner_id)
+    if cached and list(cached[1].items()) == list(connections.items()):
+        connections = cached[1]
+    connections_cache[owner_id] = (time.monotonic(), connections)
     return connections
 
-def update_stats(owner_id: int, action: str):
-    """Update statistics in MongoDB"""
-    # Use datetime for today's date at midnight UTC
-    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    
-    update_fields = {
-        "messages_sent": 1 if action == "message_sent" else 0,
-        "connections_added": 1 if action == "connection_added" else 0,
-        "connections_removed": 1 if action == "connection_removed" else 0,
-        "replies_handled": 1 if action == "reply_handled" else 0,
-        "reactions_handled": 1 if action == "reaction_handled" else 0,
-        "edits_handled": 1 if action == "edit_handled" else 0
-    }
+async def refresh_connections_periodically(owner_id: int) -> None:
+    """Keep the owner's connections cache warm so handlers never wait on MongoDB"""
+    while True:
+        await asyncio.sleep(CONNECTIONS_REFRESH_SECONDS)
+        try:
+            async with connections_lock:
+                await load_connections(owner_id)
+        except Exception as e:
+            # Serve the cached connections until the next attempt
+            logger.warning("Failed to refresh connections cache: %s", e)
+
+def update_stats(owner_id: int, action: str, count: int = 1) -> None:
+    """Queue count occurrences of action for today's statistics - written by flush_stats"""
+    daily_field, total_field = STATS_FIELDS[action]
+    daily = pending_daily_stats.setdefault((owner_id, today_utc()), {})
+    daily[daily_field] = daily.get(daily_field, 0) + count
+    totals = pending_total_stats.setdefault(owner_id, {})
+    totals[total_field] = totals.get(total_field, 0) + count
+    stats_dirty.set()
+
+def merge_stats(pending: dict, batch: dict) -> None:
+    """Add a stats batch that failed to write back into a pending buffer"""
+    for key, fields in batch.items():
+        queued = pending.setdefault(key, {})
+        for field, count in fields.items():
+            queued[field] = queued.get(field, 0) + count
+
+async def write_stats(collection, ops: list):
+    """bulk_write the ops, skipping the round trip (and pymongo's error) when there are none"""
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+
+async def flush_stats() -> None:
+    """Write the queued stats increments to MongoDB in one batch per collection"""
+    global pending_daily_stats, pending_total_stats
+    if not pending_daily_stats and not pending_total_stats:
+        return
+    daily_batch, pending_daily_stats = pending_daily_stats, {}
+    totals_batch, pending_total_stats = pending_total_stats, {}
     
-    stats_collection.update_one(
-        {
-            "owner_id": owner_id,
-            "date": today
-        },
-        {
-            "$inc": update_fields
-        },
-        upsert=True
+    daily_ops = [
+        UpdateOne({"owner_id": owner_id, "date": day}, {"$inc": fields}, upsert=True)
+        for (owner_id, day), fields in daily_batch.items()
+    ]
+    totals_ops = [
+        UpdateOne({"owner_id": owner_id}, {"$inc": fields}, upsert=True)
+        for owner_id, fields in totals_batch.items()
+    ]
+    
+    # Each side succeeds or fails on its own - only the side that raised is retried
+    daily_result, totals_result = await asyncio.gather(
+        write_stats(stats_collection, daily_ops),
+        write_stats(stats_totals_collection, totals_ops),
+        return_exceptions=True
     )
+    for collection, result, batch, pending in (
+        (stats_collection, daily_result, daily_batch, pending_daily_stats),
+        (stats_totals_collection, totals_result, totals_batch, pending_total_stats)
+    ):
+        if isinstance(result, BulkWriteError):
+            # Some of the $incs may already have landed - retrying would count them twice
+            logger.error("Stats write to %s partly failed, dropping the batch: %s", collection.name, result.details)
+        elif isinstance(result, BaseException):
+            logger.error("Failed to write stats to %s, will retry: %s", collection.name, result)
+            merge_stats(pending, batch)
+            stats_dirty.set()
+
+async def sleep_unless_stopping(seconds: float) -> None:
+    """Sleep for up to seconds, returning early once shutdown begins"""
+    try:
+        await asyncio.wait_for(flushers_stopping.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+async def flush_stats_periodically() -> None:
+    """Flush queued stats a few seconds after the first increment, coalescing bursts into one write"""
+    while not flushers_stopping.is_set():
+        await stats_dirty.wait()
+        await sleep_unless_stopping(STATS_FLUSH_SECONDS)
+        stats_dirty.clear()
+        await flush_stats()
 
-def get_bot_stats(owner_id: int):
+async def get_bot_stats(owner_id: int) -> dict:
     """Get comprehensive bot statistics"""
-    # Total connections
-    total_connections = connections_collection.count_documents({
-        "owner_id": owner_id,
-        "is_active": True
-    })
-    
-    # Today's stats - use datetime for today at midnight UTC
-    today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0)
-    today_stats = stats_collection.find_one({
-        "owner_id": owner_id,
-        "date": today
-    }) or {}
-    
-    # All-time stats
-    pipeline = [
-        {"$match": {"owner_id": owner_id}},
-        {"$group": {
-            "_id": None,
-            "total_messages": {"$sum": "$messages_sent"},
-            "total_replies": {"$sum": "$replies_handled"},
-            "total_connections_added": {"$sum": "$connections_added"},
-            "total_connections_removed": {"$sum": "$connections_removed"},
-            "total_reactions": {"$sum": "$reactions_handled"},
-            "total_edits": {"$sum": "$edits_handled"}
-        }}
-    ]
+    # Include increments still waiting in the write-behind buffer
+    await flush_stats()
+    
+    # Connection counts (one pass over the owner's connections, active and total at once),
+    # today's stats and the running all-time totals are independent - fetch them together
+    connection_counts, today_stats, all_time_stats = await asyncio.gather(
+        connections_collection.aggregate([
+            {"$match": {"owner_id": owner_id}},
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                "active": [{"$match": {"is_active": True}}, {"$count": "count"}]
+            }}
+        ]).to_list(length=1),
+        stats_collection.find_one({"owner_id": owner_id, "date": today_utc()}),
+        stats_totals_collection.find_one({"owner_id": owner_id})
+    )
+    connection_counts = connection_counts[0] if connection_counts else {}
+    today_stats = today_stats or {}
+    all_time_stats = all_time_stats or {}
     
-    all_time_stats = list(stats_collection.aggregate(pipeline))
-    all_time_stats = all_time_stats[0] if all_time_stats else {}
+    def count(facet: str) -> int:
+        return connection_counts[facet][0]["count"] if connection_counts.get(facet) else 0
     
     return {
-        "total_connections": total_connections,
+        "total_connections": count("active"),
+        "total_records": count("total"),
         "today": today_stats,
         "all_time": all_time_stats
     }
 
-def create_group_selection_keyboard(owner_id: int, selected_groups: list = None):
-    """Create inline keyboard for group selection"""
-    if selected_groups is None:
-        selected_groups = []
+def save_message_mapping(forwarded_message_id: int, mapping: dict) -> None:
+    """Remember a forwarded group message for reply routing, in memory and (write-behind) in MongoDB"""
+    message_mappings[forwarded_message_id] = mapping
+    queue_writes(message_mappings_collection, [UpdateOne(
+        {"_id": forwarded_message_id},
+        {"$set": {**mapping, "created_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )])
+
+async def get_message_mapping(forwarded_message_id: int) -> dict | None:
+    """Look up a reply-routing mapping, falling back to MongoDB for entries not in memory"""
+    # A single get - with a TTL cache the entry could expire between `in` and `[]`
+    mapping = message_mappings.get(forwarded_message_id)
+    if mapping is None and ("message", forwarded_message_id) not in missing_mappings:
+        mapping = await message_mappings_collection.find_one(
+            {"_id": forwarded_message_id},
+            {"_id": 0, "created_at": 0}
+        )
+        if mapping is not None:
+            message_mappings[forwarded_message_id] = mapping
+        else:
+            missing_mappings["message", forwarded_message_id] = True
+    return mapping
+
+def mapping_id(kind: str, key: tuple) -> str:
+    """Build the mappings_collection _id for an in-memory (chat_id, message_id) key"""
+    return f"{kind}:{key[0]}_{key[1]}"
+
+def mapping_write(kind: str, key: tuple, value: dict) -> UpdateOne:
+    """Build the MongoDB upsert mirroring one in-memory mapping entry"""
+    return UpdateOne(
+        {"_id": mapping_id(kind, key)},
+        {"$set": {"value": value, "created_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+def edit_mapping_write(edit_key: tuple, group_message: dict) -> UpdateOne:
+    """Build the MongoDB upsert appending one group message to an edit mapping"""
+    return UpdateOne(
+        {"_id": mapping_id("edit", edit_key)},
+        {"$push": {"value": group_message}, "$set": {"created_at": datetime.now(timezone.utc)}},
+        upsert=True
+    )
+
+def queue_writes(collection, ops: list) -> None:
+    """Hand mapping writes to the background writer, so handlers never wait on MongoDB"""
+    if not ops:
+        return
+    pending_writes.setdefault(collection.name, (collection, []))[1].extend(ops)
+    writes_dirty.set()
+
+async def flush_writes() -> None:
+    """Send the queued mapping writes, one unordered bulk_write per collection"""
+    global pending_writes
+    if not pending_writes:
+        return
+    batch, pending_writes = pending_writes, {}
+    
+    results = await asyncio.gather(
+        *(collection.bulk_write(ops, ordered=False) for collection, ops in batch.values()),
+        return_exceptions=True
+    )
+    for (collection, ops), result in zip(batch.values(), results):
+        if isinstance(result, BaseException):
+            # Routing still works from memory until the next restart
+            logger.warning("Failed to persist %s write(s) to %s: %s", len(ops), collection.name, result)
+
+async def flush_writes_periodically() -> None:
+    """Flush queued mapping writes shortly after the first one, coalescing bursts into one write"""
+    while not flushers_stopping.is_set():
+        await writes_dirty.wait()
+        await sleep_unless_stopping(WRITES_FLUSH_SECONDS)
+        writes_dirty.clear()
+        await flush_writes()
+
+async def get_mapping(cache: TTLCache, kind: str, key: tuple):
+    """Look up a mapping in memory, falling back to MongoDB for entries from before a restart"""
+    value = cache.get(key)
+    if value is None and (kind, key) not in missing_mappings:
+        doc = await mappings_collection.find_one({"_id": mapping_id(kind, key)}, {"_id": 0, "value": 1})
+        if doc is not None:
+            value = cache[key] = doc["value"]
+        else:
+            missing_mappings[kind, key] = True
+    return value
+
+def request_never_sent(error: NetworkError) -> bool:
+    """Whether the request failed before reaching Telegram, so repeating it can't post twice"""
+    return isinstance(error.__cause__, (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout))
+
+async def send_with_retry(send, attempts: int = 3, idempotent: bool = False):
+    """Await a Telegram API call, waiting out flood limits and retrying transient network errors.
+    Calls that post something (sends, copies, forwards) are only retried when Telegram can't have
+    acted on them; idempotent calls (edits, reactions) are retried on any network error"""
+    for attempt in range(attempts):
+        try:
+            return await send()
+        except (Forbidden, BadRequest):
+            # BadRequest subclasses NetworkError but retrying it can never succeed
+            raise
+        except RetryAfter as e:
+            # Telegram rejected the request without acting on it
+            if attempt == attempts - 1:
+                raise
+            # PTB 22.2+ may report the wait as a timedelta; earlier versions give seconds
+            delay = e.retry_after.total_seconds() if isinstance(e.retry_after, timedelta) else e.retry_after
+            await asyncio.sleep(delay)
+        except NetworkError as e:
+            # A read timeout or dropped response may come after Telegram already posted the message
+            if attempt == attempts - 1 or not (idempotent or request_never_sent(e)):
+                raise
+            await asyncio.sleep(2 ** attempt)
+
+def create_group_selection_keyboard(connections: dict, selected_groups: set[int] | None = None) -> InlineKeyboardMarkup:
+    """Create inline keyboard for group selection from the connections snapshot"""
+    global fresh_keyboard
+    if not selected_groups:
+        cached_connections, markup = fresh_keyboard
+        if cached_connections is connections:
+            return markup
+        selected_groups = set()
     
-    connections = get_all_connections(owner_id)
     keyboard = []
     
     for group_id, group_info in connections.items():
@@ -223,7 +668,10 @@ def create_group_selection_keyboard(owner_id: int, selected_groups: list = None)
             InlineKeyboardButton("❌ Cancel", callback_data="cancel_send")
         ])
     
-    return InlineKeyboardMarkup(keyboard)
+    markup = InlineKeyboardMarkup(keyboard)
+    if not selected_groups:
+        fresh_keyboard = (connections, markup)
+    return markup
 
 async def handle_group_selection(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle group selection inline buttons"""
@@ -233,7 +681,7 @@ async def handle_group_selection(update: Update, context: ContextTypes.DEFAULT_T
     user_id = query.from_user.id
     callback_data = query.data
     
-    if not is_owner(user_id):
+    if user_id != CFG.owner_id:
         await query.edit_message_text("❌ You are not authorized to use this bot.")
         return
     
@@ -243,49 +691,41 @@ async def handle_group_selection(update: Update, context: ContextTypes.DEFAULT_T
         await query.edit_message_text("❌ Message data expired. Please send the message again.")
         return
     
-    selected_groups = pending_data.get("selected_groups", [])
+    selected_groups = pending_data.get("selected_groups", set())
     
     if callback_data.startswith("select_group_"):
         group_id = int(callback_data.split("_")[2])
         
         # Toggle selection
         if group_id in selected_groups:
-            selected_groups.remove(group_id)
+            selected_groups.discard(group_id)
         else:
-            selected_groups.append(group_id)
+            selected_groups.add(group_id)
         
         # Update pending data
         pending_data["selected_groups"] = selected_groups
         pending_messages[user_id] = pending_data
         
         # Update keyboard
-        keyboard = create_group_selection_keyboard(user_id, selected_groups)
+        keyboard = create_group_selection_keyboard(pending_data["connections"], selected_groups)
         selected_count = len(selected_groups)
         
         await query.edit_message_text(
-            f"📤 **Select Groups to Send Message**\n\n"
-            f"📍 **Message Preview:**\n"
-            f"{pending_data.get('preview', 'Media message')}\n\n"
-            f"✅ **Selected:** {selected_count} group(s)\n"
-            f"👇 Tap groups to select/deselect",
+            _SELECTION_TEMPLATE.format(preview=pending_data['message_data'].get('preview', 'Media message'), count=selected_count),
             reply_markup=keyboard,
             parse_mode='Markdown'
         )
     
     elif callback_data == "select_all":
         # Select all groups
-        connections = get_all_connections(user_id)
-        selected_groups = list(connections.keys())
+        connections = pending_data["connections"]
+        selected_groups = set(connections)
         pending_data["selected_groups"] = selected_groups
         pending_messages[user_id] = pending_data
         
-        keyboard = create_group_selection_keyboard(user_id, selected_groups)
+        keyboard = create_group_selection_keyboard(connections, selected_groups)
         await query.edit_message_text(
-            f"📤 **Select Groups to Send Message**\n\n"
-            f"📍 **Message Preview:**\n"
-            f"{pending_data.get('preview', 'Media message')}\n\n"
-            f"✅ **Selected:** {len(selected_groups)} group(s)\n"
-            f"👇 Tap groups to select/deselect",
+            _SELECTION_TEMPLATE.format(preview=pending_data['message_data'].get('preview', 'Media message'), count=len(selected_groups)),
             reply_markup=keyboard,
             parse_mode='Markdown'
         )
@@ -295,130 +735,138 @@ async def handle_group_selection(update: Update, context: ContextTypes.DEFAULT_T
             await query.answer("❌ Please select at least one group!", show_alert=True)
             return
         
+        # Claim the pending message so a second tap can't send it again while this one runs
+        pending_messages.pop(user_id, None)
+        
         # Send message to selected groups
         successful_forwards = 0
         failed_forwards = []
+        needs_help = False
         
         message_data = pending_data["message_data"]
-        connections = get_all_connections(user_id)
+        connections = pending_data["connections"]
+        if message_data["type"] == "album":
+            private_message_ids = [item["message_id"] for item in message_data["items"]]
+        else:
+            private_message_ids = [message_data["message_id"]]
+        bot = context.bot
         
-        for group_id in selected_groups:
-            try:
-                if message_data["type"] == "text":
-                    sent_message = await context.bot.send_message(
-                        chat_id=group_id,
-                        text=message_data["text"]
-                    )
-                elif message_data["type"] == "sticker":
-                    sent_message = await context.bot.send_sticker(
-                        chat_id=group_id,
-                        sticker=message_data["sticker_id"]
-                    )
-                elif message_data["type"] == "photo":
-                    sent_message = await context.bot.send_photo(
-                        chat_id=group_id,
-                        photo=message_data["photo_id"],
-                        caption=message_data.get("caption", "")
-                    )
-                elif message_data["type"] == "video":
-                    sent_message = await context.bot.send_video(
-                        chat_id=group_id,
-                        video=message_data["video_id"],
-                        caption=message_data.get("caption", "")
-                    )
-                elif message_data["type"] == "document":
-                    sent_message = await context.bot.send_document(
-                        chat_id=group_id,
-                        document=message_data["document_id"],
-                        caption=message_data.get("caption", "")
-                    )
-                elif message_data["type"] == "audio":
-                    sent_message = await context.bot.send_audio(
-                        chat_id=group_id,
-                        audio=message_data["audio_id"],
-                        caption=message_data.get("caption", "")
-                    )
-                elif message_data["type"] == "voice":
-                    sent_message = await context.bot.send_voice(
-                        chat_id=group_id,
-                        voice=message_data["voice_id"]
-                    )
-                elif message_data["type"] == "animation":
-                    sent_message = await context.bot.send_animation(
-                        chat_id=group_id,
-                        animation=message_data["animation_id"],
-                        caption=message_data.get("caption", "")
+        async def send_to_group(group_id: int):
+            """Copy the pending message to one group and return (private message id, copy) pairs"""
+            # copyMessages handles every message type, and a whole album, in one request per
+            # group; copies keep an album's grouping
+            sent = await send_with_retry(lambda: bot.copy_messages(
+                chat_id=group_id,
+                from_chat_id=message_data["chat_id"],
+                message_ids=private_message_ids
+            ))
+            if len(sent) == len(private_message_ids):
+                return list(zip(private_message_ids, sent))
+            
+            # copyMessages silently skips messages it can't copy, so the copies can't be matched
+            # to their originals - take the partial copy back and copy one message at a time
+            if sent:
+                try:
+                    await send_with_retry(
+                        lambda: bot.delete_messages(chat_id=group_id, message_ids=[m.message_id for m in sent]),
+                        idempotent=True
                     )
-                else:
-                    # Fallback to copy_message for other types
-                    sent_message = await context.bot.copy_message(
+                except TelegramError as e:
+                    logger.warning("Cannot remove partial copy in group %s, leaving it unmapped: %s", group_id, e)
+                    return []
+            
+            pairs = []
+            error = None
+            for private_message_id in private_message_ids:
+                try:
+                    pairs.append((private_message_id, await send_with_retry(lambda: bot.copy_message(
                         chat_id=group_id,
                         from_chat_id=message_data["chat_id"],
-                        message_id=message_data["message_id"]
-                    )
-                
-                successful_forwards += 1
-                
+                        message_id=private_message_id
+                    ))))
+                except BadRequest as e:
+                    logger.warning("Cannot copy message %s to group %s: %s", private_message_id, group_id, e)
+                    error = e
+            if not pairs and error:
+                raise error
+            return pairs
+        
+        # Groups are independent chats, so send to them concurrently
+        async def forward_one(group_id: int):
+            """Send to one group and return (group_id, sent pairs or None, permanent failure)"""
+            async with send_slots:
+                try:
+                    return group_id, await send_to_group(group_id), False
+                except (Forbidden, BadRequest) as e:
+                    # Permanent for this group (bot removed, no rights, original deleted) - don't retry
+                    logger.warning("Cannot forward to group %s: %s", group_id, e)
+                    return group_id, None, True
+                except TelegramError as e:
+                    logger.error("Failed to forward to group %s: %s", group_id, e)
+                except Exception:
+                    logger.exception("Unexpected error forwarding to group %s", group_id)
+                return group_id, None, False
+        
+        results = await asyncio.gather(*(forward_one(group_id) for group_id in selected_groups))
+        mapping_ops = []
+        
+        for group_id, sent_messages, permanent_failure in results:
+            needs_help = needs_help or permanent_failure
+            if sent_messages is None:
+                group_name = connections.get(group_id, {}).get('name', f'ID: {group_id}')
+                failed_forwards.append(f"{group_name} (ID: {group_id})")
+                continue
+            
+            successful_forwards += 1
+            
+            for private_message_id, sent_message in sent_messages:
                 # Store mapping for reactions - group message to private message
-                mapping_key = f"{group_id}_{sent_message.message_id}"
-                group_to_private_mappings[mapping_key] = {
+                mapping_key = (group_id, sent_message.message_id)
+                group_to_private_mappings[mapping_key] = private_mapping = {
                     "private_chat_id": message_data["chat_id"],
-                    "private_message_id": message_data["message_id"]
+                    "private_message_id": private_message_id
                 }
+                mapping_ops.append(mapping_write("g2p", mapping_key, private_mapping))
                 
                 # Store edit mapping - private message to group message
-                edit_key = f"{message_data['chat_id']}_{message_data['message_id']}"
-                if edit_key not in edit_mappings:
-                    edit_mappings[edit_key] = []
-                edit_mappings[edit_key].append({
+                edit_key = (message_data["chat_id"], private_message_id)
+                group_message = {
                     "group_id": group_id,
                     "group_message_id": sent_message.message_id
-                })
-                
-                logger.info(f"📝 Stored group-to-private mapping: {mapping_key} -> {message_data['chat_id']}_{message_data['message_id']}")
-                logger.info(f"📝 Stored edit mapping: {edit_key} -> {group_id}_{sent_message.message_id}")
-                
-                # Update stats for each successful send
-                update_stats(user_id, "message_sent")
+                }
+                edit_mappings.setdefault(edit_key, []).append(group_message)
+                mapping_ops.append(edit_mapping_write(edit_key, group_message))
                 
-            except Exception as e:
-                logger.error(f"Failed to forward to group {group_id}: {e}")
-                group_name = connections.get(group_id, {}).get('name', f'ID: {group_id}')
-                failed_forwards.append(f"{group_name} (ID: {group_id})")
+                logger.debug("📝 Stored group-to-private mapping: %s -> %s_%s", mapping_key, message_data['chat_id'], private_message_id)
+                logger.debug("📝 Stored edit mapping: %s -> %s_%s", edit_key, group_id, sent_message.message_id)
+        
+        # One queued batch for every mapping of the fan-out, and one stats write
+        queue_writes(mappings_collection, mapping_ops)
+        if successful_forwards:
+            update_stats(user_id, "message_sent", count=successful_forwards)
         
         # Send summary to owner
         summary_message = f"✅ Message sent to {successful_forwards} group(s)!"
         if failed_forwards:
             summary_message += f"\n❌ Failed in {len(failed_forwards)} group(s):\n" + "\n".join(failed_forwards)
+        if needs_help:
+            summary_message += "\n\nMake sure I'm still in those groups and allowed to send messages."
         
         await query.edit_message_text(summary_message)
-        
-        # Clean up pending message
-        if user_id in pending_messages:
-            del pending_messages[user_id]
     
     elif callback_data == "cancel_send":
         await query.edit_message_text("❌ Message sending cancelled.")
         # Clean up pending message
-        if user_id in pending_messages:
-            del pending_messages[user_id]
+        pending_messages.pop(user_id, None)
 
 # Command handlers
 async def connect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /connect command"""
-    # Ignore group messages completely
-    if update.message.chat.type != "private":
-        return
-    
-    # Owner check
-    if not is_owner(update.message.from_user.id):
-        await update.message.reply_text("❌ You are not authorized to use this bot.")
-        return
-    
+    msg = update.effective_message
     args = context.args
     
     if not args:
-        await update.message.reply_text("Please provide a group ID. Usage: /connect <group_id>")
+        await msg.reply_text("Please provide a group ID. Usage: /connect <group_id>")
         return
     
     try:
@@ -431,7 +879,7 @@ async def connect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             group_type = "Supergroup" if chat.type == "supergroup" else "Group"
             group_username = f"@{chat.username}" if chat.username else ""
         except Exception as e:
-            await update.message.reply_text(
+            await msg.reply_text(
                 f"❌ Cannot access group {group_id}. Make sure:\n"
                 "1. The group ID is correct\n"
                 "2. I'm added to the group\n"
@@ -440,7 +888,7 @@ async def connect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             )
             return
         
-        save_connection(update.message.from_user.id, group_id, group_name, group_username)
+        await save_connection(msg.from_user.id, group_id, group_name, group_username)
         
         # Store in active groups cache
         active_groups[group_id] = {
@@ -450,101 +898,105 @@ async def connect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             'username': group_username
         }
         
-        await update.message.reply_text(
-            f"✅ Connected to {group_type}: {group_name} (ID: {group_id})!\n\n"
-            "🔄 Features:\n"
-            "- Send any message and select groups to send to\n"
-            "- When someone replies to BOT'S messages in connected groups, I'll forward them to you\n"
-            "- When someone mentions/tags the bot in groups, I'll forward those messages to you\n"
-            "- Reply to those messages and I'll send your response back!\n"
-            "- Edit your messages and I'll update them in groups automatically\n"
-            "- React to messages and I'll mirror reactions in groups\n"
-            "- Use /stats to see all connected groups\n"
-            "- Use /disconnect <group_id> to remove a group\n"
-            "- Use /botstats for detailed statistics"
-        )
+        await msg.reply_text(_CONNECTED_TEMPLATE.format(type=group_type, name=group_name, id=group_id))
     except ValueError:
-        await update.message.reply_text("Invalid group ID. Must be an integer.")
+        await msg.reply_text(_INVALID_GROUP_ID_TEXT)
 
 async def disconnect_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /disconnect command"""
-    if update.message.chat.type != "private":
-        return
-    
-    if not is_owner(update.message.from_user.id):
-        await update.message.reply_text("❌ You are not authorized to use this bot.")
-        return
-    
     args = context.args
     
     if not args:
         # Show current connections and disconnect instructions
-        connections = get_all_connections(update.message.from_user.id)
+        connections = await get_all_connections(update.message.from_user.id)
         if not connections:
-            await update.message.reply_text("❌ You are not connected to any groups!")
+            await update.message.reply_text(_NOT_CONNECTED_TEXT)
             return
         
-        message = "📋 Your Connected Groups:\n\n"
-        for group_id, group_info in connections.items():
-            message += f"• {group_info['name']} (ID: {group_id})\n"
-        
-        message += "\nTo disconnect from a group, use: /disconnect <group_id>"
-        await update.message.reply_text(message)
+        lines = [f"• {group_info['name']} (ID: {group_id})" for group_id, group_info in connections.items()]
+        await update.message.reply_text(
+            "📋 Your Connected Groups:\n\n"
+            + "\n".join(lines)
+            + "\n\nTo disconnect from a group, use: /disconnect <group_id>"
+        )
         return
     
     try:
         group_id = int(args[0])
-        connections = get_all_connections(update.message.from_user.id)
-        
-        if group_id not in connections:
-            await update.message.reply_text(f"❌ You are not connected to group {group_id}!")
-            return
-        
-        group_name = connections[group_id]['name']
-        success = remove_connection(update.message.from_user.id, group_id)
-        
-        if success:
-            # Remove from active groups cache
-            if group_id in active_groups:
-                del active_groups[group_id]
-            
-            await update.message.reply_text(f"✅ Disconnected from group: {group_name} (ID: {group_id})")
-        else:
-            await update.message.reply_text(f"❌ Failed to disconnect from group {group_id}")
-        
     except ValueError:
-        await update.message.reply_text("Invalid group ID. Must be an integer.")
-
-async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /stats command to show group details"""
-    if update.message.chat.type != "private":
+        await update.message.reply_text(_INVALID_GROUP_ID_TEXT)
         return
+    await do_disconnect(update, group_id)
+
+async def do_disconnect(update: Update, group_id: int) -> None:
+    """Disconnect the owner from a group and report the result - shared by /disconnect and /disconnect_<id>"""
+    owner_id = update.message.from_user.id
+    connections = await get_all_connections(owner_id)
     
-    if not is_owner(update.message.from_user.id):
-        await update.message.reply_text("❌ You are not authorized to use this bot.")
+    if group_id not in connections:
+        await update.message.reply_text(f"❌ You are not connected to group {group_id}!")
         return
     
-    connections = get_all_connections(update.message.from_user.id)
+    group_name = connections[group_id]['name']
+    success = await remove_connection(owner_id, group_id)
+    
+    if success:
+        # Remove from active groups cache
+        active_groups.pop(group_id, None)
+        await update.message.reply_text(f"✅ Disconnected from group: {group_name} (ID: {group_id})")
+    else:
+        await update.message.reply_text(f"❌ Failed to disconnect from group {group_id}")
+
+def md_escape(text: str) -> str:
+    """Escape a group name for a legacy Markdown message"""
+    return text.translate(_MD_ESCAPE_TABLE)
+
+async def get_chat_cached(bot, group_id: int):
+    """Return the group's Chat, from chat_info_cache when it was fetched recently"""
+    chat = chat_info_cache.get(group_id)
+    if chat is None:
+        chat = chat_info_cache[group_id] = await bot.get_chat(group_id)
+    return chat
+
+async def verbose_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /verbose command to toggle success confirmations"""
+    global verbose_confirmations
+    verbose = not verbose_confirmations
+    # Persist first so a failed write leaves the running setting matching the stored one
+    await settings_collection.update_one(
+        {"owner_id": update.message.from_user.id},
+        {"$set": {"verbose": verbose}},
+        upsert=True
+    )
+    verbose_confirmations = verbose
+    if verbose_confirmations:
+        await update.message.reply_text("🔊 Verbose mode on - I'll confirm every reply and edit.")
+    else:
+        await update.message.reply_text("🔇 Verbose mode off - I'll only tell you when something fails.")
+
+async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /stats command to show group details"""
+    connections = await get_all_connections(update.message.from_user.id)
     
     if not connections:
-        await update.message.reply_text("❌ You are not connected to any groups!")
+        await update.message.reply_text(_NOT_CONNECTED_TEXT)
         return
     
-    # Start building the message
-    message_parts = []
     total_groups = len(connections)
     total_members = 0
+    # One string per group, joined once at the end
+    blocks = []
+    
+    # Get fresh info for every group at once
+    owner_id = update.message.from_user.id
+    chats = await asyncio.gather(
+        *(get_chat_cached(context.bot, group_id) for group_id in connections),
+        return_exceptions=True
+    )
+    refresh_ops = []
     
-    # Add summary at the top
-    message_parts.append("📊 *Connected Groups*")
-    message_parts.append("")
-    message_parts.append(f"📈 *Total Groups Connected:* {total_groups}")
-    
-    # Get fresh info for each group
-    for group_id, group_info in connections.items():
-        try:
-            # Try to get updated group info
-            chat = await context.bot.get_chat(group_id)
+    for (group_id, group_info), chat in zip(connections.items(), chats):
+        if not isinstance(chat, BaseException):
             member_count = getattr(chat, 'member_count', 'Unknown')
             if isinstance(member_count, int):
                 total_members += member_count
@@ -560,28 +1012,27 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 'username': username
             }
             
-            # Update database with fresh info - FIXED: Added missing closing brace
-            connections_collection.update_one(
-                {"owner_id": update.message.from_user.id, "group_id": group_id},
-                {"$set": {
-                    "group_name": chat.title,
-                    "group_username": username
-                }}
-            )
-            
-            # Escape any Markdown characters in the group name
-            group_name_escaped = chat.title.replace('*', '\\*').replace('_', '\\_').replace('`', '\\`').replace('[', '\\[')
+            # Queue the database refresh only when something changed - written in one batch below
+            if chat.title != group_info['name'] or username != group_info.get('username'):
+                refresh_ops.append(UpdateOne(
+                    {"owner_id": owner_id, "group_id": group_id},
+                    {"$set": {
+                        "group_name": chat.title,
+                        "group_username": username
+                    }}
+                ))
             
-            message_parts.append(f"🏷️ *{group_name_escaped}*")
-            message_parts.append(f"   📝 Type: {group_type}")
-            message_parts.append(f"   🆔 ID: `{group_id}`")
-            message_parts.append(f"   👥 Members: {member_count}")
-            message_parts.append(f"   🔗 {username}")
-            message_parts.append(f"   ➖ /disconnect_{group_id}")
-            message_parts.append("")
+            blocks.append(
+                f"🏷️ *{md_escape(chat.title)}*\n"
+                f"   📝 Type: {group_type}\n"
+                f"   🆔 ID: `{group_id}`\n"
+                f"   👥 Members: {member_count}\n"
+                f"   🔗 {username}\n"
+                f"   ➖ /disconnect_{group_id}\n"
+            )
             
-        except Exception as e:
-            logger.error(f"Error getting chat info for group {group_id}: {e}")
+        else:
+            logger.error("Error getting chat info for group %s: %s", group_id, chat)
             # Use cached info if available
             if group_id in active_groups:
                 group_data = active_groups[group_id]
@@ -589,56 +1040,56 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 if isinstance(member_count, int):
                     total_members += member_count
                 
-                # Escape any Markdown characters in the group name
-                group_name_escaped = group_data['name'].replace('*', '\\*').replace('_', '\\_').replace('`', '\\`').replace('[', '\\[')
-                
-                message_parts.append(f"🏷️ *{group_name_escaped}*")
-                message_parts.append(f"   📝 Type: {group_data['type']}")
-                message_parts.append(f"   🆔 ID: `{group_id}`")
-                message_parts.append(f"   👥 Members: {member_count}")
-                message_parts.append(f"   🔗 {group_data.get('username', 'No username')}")
-                message_parts.append(f"   ⚠️ Could not refresh info")
-                message_parts.append(f"   ➖ /disconnect_{group_id}")
-                message_parts.append("")
+                blocks.append(
+                    f"🏷️ *{md_escape(group_data['name'])}*\n"
+                    f"   📝 Type: {group_data['type']}\n"
+                    f"   🆔 ID: `{group_id}`\n"
+                    f"   👥 Members: {member_count}\n"
+                    f"   🔗 {group_data.get('username', 'No username')}\n"
+                    "   ⚠️ Could not refresh info\n"
+                    f"   ➖ /disconnect_{group_id}\n"
+                )
             else:
-                # Escape any Markdown characters in the group name
-                group_name_escaped = group_info['name'].replace('*', '\\*').replace('_', '\\_').replace('`', '\\`').replace('[', '\\[')
-                
-                message_parts.append(f"🏷️ *{group_name_escaped}*")
-                message_parts.append(f"   🆔 ID: `{group_id}`")
-                message_parts.append(f"   ⚠️ Could not fetch group info")
-                message_parts.append(f"   ➖ /disconnect_{group_id}")
-                message_parts.append("")
-    
-    # Add total members to summary if we have the data
-    if total_members > 0:
-        message_parts.insert(2, f"👥 *Total Members:* {total_members}")
-        message_parts.insert(3, "")  # Add empty line for spacing
-    
-    message_parts.append("💡 Use /disconnect <group_id> to remove a group")
+                blocks.append(
+                    f"🏷️ *{md_escape(group_info['name'])}*\n"
+                    f"   🆔 ID: `{group_id}`\n"
+                    "   ⚠️ Could not fetch group info\n"
+                    f"   ➖ /disconnect_{group_id}\n"
+                )
     
-    # Join all parts and send
-    final_message = "\n".join(message_parts)
+    if refresh_ops:
+        async with connections_lock:
+            try:
+                await connections_collection.bulk_write(refresh_ops, ordered=False)
+            except Exception as e:
+                logger.error("Failed to refresh group info in MongoDB: %s", e)
+            connections_cache.pop(owner_id, None)
     
-    # If message is too long, split it
-    if len(final_message) > 4000:
-        # Split into chunks of 4000 characters
-        chunks = [final_message[i:i+4000] for i in range(0, len(final_message), 4000)]
-        for chunk in chunks:
-            await update.message.reply_text(chunk, parse_mode='Markdown')
+    # Summary at the top, with total members if we have the data
+    summary = "📊 *Connected Groups*\n\n"
+    if total_members > 0:
+        summary += f"👥 *Total Members:* {total_members}\n\n"
+    summary += f"📈 *Total Groups Connected:* {total_groups}"
+    
+    # Split between group blocks, never inside one, so every message stays valid Markdown
+    chunks = [summary]
+    for block in blocks:
+        if len(chunks[-1]) + len(block) + 1 > 4000:
+            chunks.append(block)
+        else:
+            chunks[-1] += "\n" + block
+    footer = "💡 Use /disconnect <group_id> to remove a group"
+    if len(chunks[-1]) + len(footer) + 1 > 4000:
+        chunks.append(footer)
     else:
-        await update.message.reply_text(final_message, parse_mode='Markdown')
+        chunks[-1] += "\n" + footer
+    
+    for chunk in chunks:
+        await update.message.reply_text(chunk, parse_mode='Markdown')
 
 async def botstats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /botstats command for detailed statistics"""
-    if update.message.chat.type != "private":
-        return
-    
-    if not is_owner(update.message.from_user.id):
-        await update.message.reply_text("❌ You are not authorized to use this bot.")
-        return
-    
-    stats = get_bot_stats(update.message.from_user.id)
+    stats = await get_bot_stats(update.message.from_user.id)
     
     message_parts = []
     message_parts.append("🤖 *Bot Statistics*")
@@ -672,156 +1123,111 @@ async def botstats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         message_parts.append("• No activity today")
     
     # Database info
-    total_db_connections = connections_collection.count_documents({
-        "owner_id": update.message.from_user.id
-    })
-    active_db_connections = connections_collection.count_documents({
-        "owner_id": update.message.from_user.id,
-        "is_active": True
-    })
-    
     message_parts.append("")
     message_parts.append("💾 *Database*")
-    message_parts.append(f"• Total Records: `{total_db_connections}`")
-    message_parts.append(f"• Active Connections: `{active_db_connections}`")
+    message_parts.append(f"• Total Records: `{stats['total_records']}`")
+    message_parts.append(f"• Active Connections: `{stats['total_connections']}`")
     
     final_message = "\n".join(message_parts)
     
     await update.message.reply_text(final_message, parse_mode='Markdown')
 
+def build_message_data(msg: Message) -> dict:
+    """Describe a private message for group selection: its type, source ids and preview"""
+    message_data = {"chat_id": msg.chat_id, "message_id": msg.message_id}
+    
+    for kind, label, shows_caption in MEDIA_TABLE:
+        if getattr(msg, kind):
+            message_data["type"] = kind
+            message_data["preview"] = label
+            if shows_caption and msg.caption:
+                message_data["preview"] += f" - {msg.caption}"
+            return message_data
+    
+    if msg.text:
+        message_data["type"] = "text"
+        # Truncate long text for preview
+        message_data["preview"] = msg.text if len(msg.text) <= 100 else msg.text[:97] + "..."
+    else:
+        # Locations, polls, contacts... - previewed as "Media message"
+        message_data["type"] = "other"
+    return message_data
+
 async def handle_private_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle incoming private messages from owner"""
-    # Owner check
-    if not is_owner(update.message.from_user.id):
-        await update.message.reply_text("❌ You are not authorized to use this bot.")
-        return
-    
-    user_id = update.message.from_user.id
-    connections = get_all_connections(user_id)
+    msg: Message = update.message
+    user_id: int = msg.from_user.id
+    connections = await get_all_connections(user_id)
     
     if not connections:
-        await update.message.reply_text(
-            "⚠️ You're not connected to any groups! "
-            "Use /connect <group_id> first."
-        )
+        await msg.reply_text(_CONNECT_FIRST_TEXT)
         return
     
     # Check if this is a reply to a forwarded group message
-    if update.message.reply_to_message:
-        original_private_msg = update.message.reply_to_message
+    if msg.reply_to_message:
+        original_private_msg = msg.reply_to_message
         
         # Check if this was a forwarded group message that has mapping
-        if original_private_msg.message_id in message_mappings:
+        mapping = await get_message_mapping(original_private_msg.message_id)
+        if mapping is not None:
             
-            mapping = message_mappings[original_private_msg.message_id]
             original_group_msg_id = mapping['original_group_message_id']
-            original_sender = mapping['sender']
             target_group_id = mapping['group_id']
             
             # Verify the group is still connected
             if target_group_id not in connections:
-                await update.message.reply_text("❌ You are no longer connected to that group!")
+                await msg.reply_text("❌ You are no longer connected to that group!")
                 return
             
             try:
-                # Send reply back to the group as a direct reply to the user's message
-                if update.message.sticker:
-                    sent_message = await context.bot.send_sticker(
-                        chat_id=target_group_id,
-                        sticker=update.message.sticker.file_id,
-                        reply_to_message_id=original_group_msg_id
-                    )
-                elif update.message.text:
-                    sent_message = await context.bot.send_message(
-                        chat_id=target_group_id,
-                        text=update.message.text,
-                        reply_to_message_id=original_group_msg_id
-                    )
-                elif update.message.photo:
-                    sent_message = await context.bot.send_photo(
-                        chat_id=target_group_id,
-                        photo=update.message.photo[-1].file_id,
-                        caption=update.message.caption,
-                        reply_to_message_id=original_group_msg_id
-                    )
-                elif update.message.video:
-                    sent_message = await context.bot.send_video(
-                        chat_id=target_group_id,
-                        video=update.message.video.file_id,
-                        caption=update.message.caption,
-                        reply_to_message_id=original_group_msg_id
-                    )
-                elif update.message.document:
-                    sent_message = await context.bot.send_document(
-                        chat_id=target_group_id,
-                        document=update.message.document.file_id,
-                        caption=update.message.caption,
-                        reply_to_message_id=original_group_msg_id
-                    )
-                elif update.message.audio:
-                    sent_message = await context.bot.send_audio(
-                        chat_id=target_group_id,
-                        audio=update.message.audio.file_id,
-                        caption=update.message.caption,
-                        reply_to_message_id=original_group_msg_id
-                    )
-                elif update.message.voice:
-                    sent_message = await context.bot.send_voice(
-                        chat_id=target_group_id,
-                        voice=update.message.voice.file_id,
-                        reply_to_message_id=original_group_msg_id
-                    )
-                elif update.message.animation:
-                    sent_message = await context.bot.send_animation(
-                        chat_id=target_group_id,
-                        animation=update.message.animation.file_id,
-                        caption=update.message.caption,
-                        reply_to_message_id=original_group_msg_id
-                    )
-                else:
-                    # For other media types
-                    sent_message = await context.bot.copy_message(
-                        chat_id=target_group_id,
-                        from_chat_id=update.message.chat_id,
-                        message_id=update.message.message_id,
-                        reply_to_message_id=original_group_msg_id
-                    )
+                # Copy the reply back to the group as a direct reply to the user's message -
+                # copy_message handles every message type and keeps text formatting
+                sent_message = await send_with_retry(lambda: context.bot.copy_message(
+                    chat_id=target_group_id,
+                    from_chat_id=msg.chat_id,
+                    message_id=msg.message_id,
+                    reply_to_message_id=original_group_msg_id
+                ))
                 
                 # Store mapping for reactions - your reply in group to your private message
-                mapping_key = f"{target_group_id}_{sent_message.message_id}"
-                group_to_private_mappings[mapping_key] = {
-                    "private_chat_id": update.message.chat_id,
-                    "private_message_id": update.message.message_id
+                mapping_key = (target_group_id, sent_message.message_id)
+                group_to_private_mappings[mapping_key] = private_mapping = {
+                    "private_chat_id": msg.chat_id,
+                    "private_message_id": msg.message_id
                 }
+                mapping_ops = [mapping_write("g2p", mapping_key, private_mapping)]
                 
                 # Store edit mapping for the reply
-                edit_key = f"{update.message.chat_id}_{update.message.message_id}"
-                if edit_key not in edit_mappings:
-                    edit_mappings[edit_key] = []
-                edit_mappings[edit_key].append({
+                edit_key = (msg.chat_id, msg.message_id)
+                group_message = {
                     "group_id": target_group_id,
                     "group_message_id": sent_message.message_id
-                })
+                }
+                edit_mappings.setdefault(edit_key, []).append(group_message)
+                mapping_ops.append(edit_mapping_write(edit_key, group_message))
                 
-                logger.info(f"📝 Stored reply mapping: {mapping_key} -> {update.message.chat_id}_{update.message.message_id}")
-                logger.info(f"📝 Stored edit mapping for reply: {edit_key} -> {target_group_id}_{sent_message.message_id}")
+                logger.debug("📝 Stored reply mapping: %s -> %s_%s", mapping_key, msg.chat_id, msg.message_id)
+                logger.debug("📝 Stored edit mapping for reply: %s -> %s_%s", edit_key, target_group_id, sent_message.message_id)
                 
                 # Also store the reverse mapping for the original group message that was replied to
-                original_mapping_key = f"{target_group_id}_{original_group_msg_id}"
+                original_mapping_key = (target_group_id, original_group_msg_id)
                 if original_mapping_key not in group_to_private_mappings:
-                    group_to_private_mappings[original_mapping_key] = {
+                    group_to_private_mappings[original_mapping_key] = original_mapping = {
                         "private_chat_id": original_private_msg.chat_id,
                         "private_message_id": original_private_msg.message_id
                     }
-                    logger.info(f"📝 Stored original message mapping: {original_mapping_key}")
+                    mapping_ops.append(mapping_write("g2p", original_mapping_key, original_mapping))
+                    logger.debug("📝 Stored original message mapping: %s", original_mapping_key)
+                queue_writes(mappings_collection, mapping_ops)
                 
                 # Update stats
                 update_stats(user_id, "reply_handled")
-                await update.message.reply_text("✅ Your response has been sent to the group!")
+                if verbose_confirmations:
+                    await msg.reply_text("✅ Your response has been sent to the group!")
                 
             except Exception as e:
-                logger.error(f"Failed to send reply to group: {e}")
-                await update.message.reply_text(
+                logger.error("Failed to send reply to group: %s", e)
+                await msg.reply_text(
                     f"❌ Failed to send response: {str(e)}\n"
                     "Make sure:\n"
                     "1. I'm still in the group\n"
@@ -830,165 +1236,130 @@ async def handle_private_message(update: Update, context: ContextTypes.DEFAULT_T
                 )
             return
     
+    # Albums arrive as one update per item - collect them and offer a single group selection
+    if msg.media_group_id:
+        album_key = (msg.chat_id, msg.media_group_id)
+        if album_key not in album_buffers:
+            album_buffers[album_key] = []
+            context.application.create_task(send_album_selection(album_key, user_id, connections), update=update)
+        album_buffers[album_key].append(msg)
+        return
+    
     # Normal message forwarding (not a reply) - show group selection
-    message_data = {
-        "type": "text",
-        "chat_id": update.message.chat_id,
-        "message_id": update.message.message_id,
-        "text": update.message.text if update.message.text else "Media message"
+    message_data = build_message_data(msg)
+    
+    # Store pending message, with the connections it was offered, for the selection callbacks
+    pending_messages[user_id] = {
+        "message_data": message_data,
+        "connections": connections,
+        "selected_groups": set()  # Start with no groups selected
     }
     
-    # Determine message type and prepare data
-    if update.message.sticker:
-        message_data = {
-            "type": "sticker",
-            "chat_id": update.message.chat_id,
-            "message_id": update.message.message_id,
-            "sticker_id": update.message.sticker.file_id,
-            "preview": "🎨 Sticker"
-        }
-    elif update.message.photo:
-        message_data = {
-            "type": "photo",
-            "chat_id": update.message.chat_id,
-            "message_id": update.message.message_id,
-            "photo_id": update.message.photo[-1].file_id,
-            "caption": update.message.caption,
-            "preview": "🖼️ Photo" + (f" - {update.message.caption}" if update.message.caption else "")
-        }
-    elif update.message.video:
-        message_data = {
-            "type": "video",
-            "chat_id": update.message.chat_id,
-            "message_id": update.message.message_id,
-            "video_id": update.message.video.file_id,
-            "caption": update.message.caption,
-            "preview": "🎥 Video" + (f" - {update.message.caption}" if update.message.caption else "")
-        }
-    elif update.message.document:
-        message_data = {
-            "type": "document",
-            "chat_id": update.message.chat_id,
-            "message_id": update.message.message_id,
-            "document_id": update.message.document.file_id,
-            "caption": update.message.caption,
-            "preview": "📄 Document" + (f" - {update.message.caption}" if update.message.caption else "")
-        }
-    elif update.message.audio:
-        message_data = {
-            "type": "audio",
-            "chat_id": update.message.chat_id,
-            "message_id": update.message.message_id,
-            "audio_id": update.message.audio.file_id,
-            "caption": update.message.caption,
-            "preview": "🎵 Audio" + (f" - {update.message.caption}" if update.message.caption else "")
-        }
-    elif update.message.voice:
-        message_data = {
-            "type": "voice",
-            "chat_id": update.message.chat_id,
-            "message_id": update.message.message_id,
-            "voice_id": update.message.voice.file_id,
-            "preview": "🎤 Voice Message"
-        }
-    elif update.message.animation:
-        message_data = {
-            "type": "animation",
-            "chat_id": update.message.chat_id,
-            "message_id": update.message.message_id,
-            "animation_id": update.message.animation.file_id,
-            "caption": update.message.caption,
-            "preview": "🎬 Animation" + (f" - {update.message.caption}" if update.message.caption else "")
-        }
-    elif update.message.text:
-        # Truncate long text for preview
-        preview = update.message.text
-        if len(preview) > 100:
-            preview = preview[:97] + "..."
-        message_data["preview"] = preview
+    # Create and send group selection keyboard
+    keyboard = create_group_selection_keyboard(connections)
+    
+    await msg.reply_text(
+        _SELECTION_TEMPLATE.format(preview=message_data.get('preview', 'Media message'), count=0),
+        reply_markup=keyboard,
+        parse_mode='Markdown'
+    )
+
+async def send_album_selection(album_key: tuple, user_id: int, connections: dict) -> None:
+    """Wait for the rest of an album to arrive, then show group selection for all of it"""
+    await asyncio.sleep(ALBUM_WAIT_SECONDS)
+    messages = sorted(album_buffers.pop(album_key), key=lambda msg: msg.message_id)
+    
+    # copy_messages needs the ids in increasing order, which sorting guarantees
+    items = [{"message_id": msg.message_id, "caption": msg.caption} for msg in messages]
+    
+    caption = next((item["caption"] for item in items if item["caption"]), None)
+    message_data = {
+        "type": "album",
+        "chat_id": messages[0].chat_id,
+        "message_id": messages[0].message_id,
+        "items": items,
+        "preview": f"🖼️ Album ({len(items)} items)" + (f" - {caption}" if caption else "")
+    }
     
-    # Store pending message
+    # Store pending message, with the connections it was offered, for the selection callbacks
     pending_messages[user_id] = {
         "message_data": message_data,
-        "selected_groups": []  # Start with no groups selected
+        "connections": connections,
+        "selected_groups": set()  # Start with no groups selected
     }
     
-    # Create and send group selection keyboard
-    keyboard = create_group_selection_keyboard(user_id)
-    
-    await update.message.reply_text(
-        f"📤 **Select Groups to Send Message**\n\n"
-        f"📍 **Message Preview:**\n"
-        f"{message_data.get('preview', 'Media message')}\n\n"
-        f"✅ **Selected:** 0 group(s)\n"
-        f"👇 Tap groups to select/deselect",
+    keyboard = create_group_selection_keyboard(connections)
+    
+    await messages[0].reply_text(
+        _SELECTION_TEMPLATE.format(preview=message_data['preview'], count=0),
         reply_markup=keyboard,
         parse_mode='Markdown'
     )
 
 async def handle_private_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle edited private messages from owner"""
-    # Owner check
-    if not is_owner(update.edited_message.from_user.id):
-        return
-    
     user_id = update.edited_message.from_user.id
     private_chat_id = update.edited_message.chat_id
     private_message_id = update.edited_message.message_id
     
     # Check if this edited message has group mappings
-    edit_key = f"{private_chat_id}_{private_message_id}"
+    edit_key = (private_chat_id, private_message_id)
     
-    logger.info(f"🔍 Checking edit mappings for key: {edit_key}")
-    logger.info(f"🔍 Available edit keys: {list(edit_mappings.keys())}")
+    logger.debug("🔍 Checking edit mappings for key: %s", edit_key)
     
-    if edit_key in edit_mappings:
-        group_messages = edit_mappings[edit_key]
+    group_messages = await get_mapping(edit_mappings, "edit", edit_key)
+    if group_messages:
         successful_edits = 0
         failed_edits = []
         
-        logger.info(f"🔍 Found {len(group_messages)} group messages to edit")
+        logger.debug("🔍 Found %s group messages to edit", len(group_messages))
         
-        for group_msg in group_messages:
+        async def edit_one(group_msg: dict) -> bool:
+            """Edit one group copy and return whether it succeeded"""
             group_id = group_msg["group_id"]
             group_message_id = group_msg["group_message_id"]
             
-            try:
-                # Edit the corresponding group message
-                if update.edited_message.text:
-                    await context.bot.edit_message_text(
+            async with edit_slots:
+                try:
+                    await send_with_retry(lambda: context.bot.edit_message_text(
                         chat_id=group_id,
                         message_id=group_message_id,
                         text=update.edited_message.text
-                    )
-                    successful_edits += 1
-                    logger.info(f"✅ Edited group message: {group_id}_{group_message_id}")
-                # Note: Currently only text editing is supported
-                # For other message types, we'd need different edit methods
-                
-            except Exception as e:
-                logger.error(f"Failed to edit group message {group_id}_{group_message_id}: {e}")
-                failed_edits.append(f"Group {group_id} (Message {group_message_id})")
+                    ), idempotent=True)
+                except Exception as e:
+                    logger.error("Failed to edit group message %s_%s: %s", group_id, group_message_id, e)
+                    failed_edits.append(f"Group {group_id} (Message {group_message_id})")
+                    return False
+            logger.info("✅ Edited group message: %s_%s", group_id, group_message_id)
+            return True
+        
+        # Note: Currently only text editing is supported
+        # For other message types, we'd need different edit methods
+        if update.edited_message.text:
+            # The group copies are independent, so edit them all at once
+            results = await asyncio.gather(*(edit_one(group_msg) for group_msg in group_messages))
+            successful_edits = sum(results)
         
         # Update stats
         if successful_edits > 0:
             update_stats(user_id, "edit_handled")
-            logger.info(f"✅ Successfully edited {successful_edits} group message(s)")
+            logger.info("✅ Successfully edited %s group message(s)", successful_edits)
             
             # Send confirmation to owner
-            await context.bot.send_message(
-                chat_id=private_chat_id,
-                text=f"✅ Message updated in {successful_edits} group(s)!"
-            )
+            if verbose_confirmations:
+                await context.bot.send_message(
+                    chat_id=private_chat_id,
+                    text=f"✅ Message updated in {successful_edits} group(s)!"
+                )
         
         if failed_edits:
-            logger.warning(f"❌ Failed to edit {len(failed_edits)} group message(s): {failed_edits}")
+            logger.warning("❌ Failed to edit %s group message(s): %s", len(failed_edits), failed_edits)
             await context.bot.send_message(
                 chat_id=private_chat_id,
                 text=f"❌ Failed to update message in {len(failed_edits)} group(s)"
             )
     else:
-        logger.info(f"ℹ️ No edit mapping found for private message: {edit_key}")
+        logger.info("ℹ️ No edit mapping found for private message: %s", edit_key)
         await context.bot.send_message(
             chat_id=private_chat_id,
             text="❌ No edit mapping found for this message. Only messages sent through the bot can be edited."
@@ -996,109 +1367,117 @@ async def handle_private_edit(update: Update, context: ContextTypes.DEFAULT_TYPE
 
 async def handle_bot_related_group_messages(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle ONLY messages in connected groups that are replies to bot OR mention the bot"""
+    msg: Message = update.message
     # Only process messages in connected groups
-    group_id = update.message.chat.id
+    group_id: int = msg.chat.id
     
     # Get owner's connections to verify this is a connected group
-    owner_connections = get_all_connections(int(OWNER_ID))
+    owner_connections = await get_all_connections(CFG.owner_id)
     if group_id not in owner_connections:
         return
     
-    # Get bot info
-    bot_info = await context.bot.get_me()
-    bot_username = bot_info.username
-    bot_id = bot_info.id
+    # Bot identity fetched once by Application.initialize - no API call per message.
+    # Usernames are case-insensitive, so match the mention in lowercase
+    bot_id = context.bot.id
+    mention = f"@{context.bot.username}".lower()
     
     # Check if this message is related to the bot
     is_bot_related = False
     reason = ""
     
-    # Case 1: Message is a reply to a message sent by the bot
-    if update.message.reply_to_message:
-        replied_to_user = update.message.reply_to_message.from_user
+    # Case 1: Message is a reply to a message sent by the bot - an integer compare, so check it first
+    if msg.reply_to_message:
+        replied_to_user = msg.reply_to_message.from_user
         if replied_to_user and replied_to_user.id == bot_id:
             is_bot_related = True
             reason = "reply to bot's message"
     
-    # Case 2: Message mentions the bot (via username or direct mention)
-    if not is_bot_related and update.message.text:
-        # Check for bot username mention
-        if bot_username and f"@{bot_username}" in update.message.text:
-            is_bot_related = True
-            reason = f"mentioned @{bot_username}"
-    
-    # Case 3: Check for bot mention in caption (for media messages)
-    if not is_bot_related and update.message.caption and bot_username:
-        if f"@{bot_username}" in update.message.caption:
+    # Case 2: Message mentions the bot in its text or caption. A one-pass substring test also
+    # covers @mention entities, whose text is always part of the message text
+    if not is_bot_related:
+        content = msg.text or msg.caption
+        if content and mention in content.lower():
             is_bot_related = True
-            reason = f"mentioned @{bot_username} in caption"
-    
-    # Case 4: Check if bot is directly mentioned in entities
-    if not is_bot_related and update.message.entities:
-        for entity in update.message.entities:
-            if entity.type == "mention" and bot_username:
-                mention_text = update.message.text[entity.offset:entity.offset + entity.length]
-                if mention_text == f"@{bot_username}":
-                    is_bot_related = True
-                    reason = "direct mention"
-                    break
+            reason = f"mentioned {mention}" + (" in caption" if msg.caption else "")
     
     # If not bot-related, ignore the message
     if not is_bot_related:
         return
     
-    user_id = update.message.from_user.id
     group_name = owner_connections[group_id]['name']
     
     try:
         # Get info about who sent the message
-        user_name = update.message.from_user.first_name
-        if update.message.from_user.username:
-            user_name = f"@{update.message.from_user.username}"
+        user_name = msg.from_user.first_name
+        if msg.from_user.username:
+            user_name = f"@{msg.from_user.username}"
         
-        # If this is a reply to bot's message, first forward the message that was replied to
-        if update.message.reply_to_message and update.message.reply_to_message.from_user.id == bot_id:
+        # Forward the message the user sent - preceded, when it replies to the bot, by the
+        # message it replied to for context - in a single call
+        message_ids = [msg.message_id]
+        if msg.reply_to_message and msg.reply_to_message.from_user.id == bot_id:
+            message_ids.insert(0, msg.reply_to_message.message_id)
+        forwarded = await send_with_retry(lambda: context.bot.forward_messages(
+            chat_id=CFG.owner_id,
+            from_chat_id=group_id,
+            message_ids=message_ids
+        ))
+        if len(forwarded) == len(message_ids):
+            forwarded_msg = forwarded[-1]
+        else:
+            # Telegram skips messages it can't forward, so a short result can't tell which one
+            # arrived - take it back and forward just the user's message
+            if forwarded:
+                try:
+                    await send_with_retry(
+                        lambda: context.bot.delete_messages(
+                            chat_id=CFG.owner_id,
+                            message_ids=[m.message_id for m in forwarded]
+                        ),
+                        idempotent=True
+                    )
+                except TelegramError as e:
+                    logger.warning("Cannot remove partial forward from group %s: %s", group_id, e)
+            forwarded = ()
+            forwarded_msg = await send_with_retry(lambda: context.bot.forward_message(
+                chat_id=CFG.owner_id,
+                from_chat_id=group_id,
+                message_id=msg.message_id
+            ))
+        
+        if len(forwarded) == 2:
             try:
-                # Forward the message that was replied to (for context)
-                replied_msg = await context.bot.forward_message(
-                    chat_id=OWNER_ID,
-                    from_chat_id=group_id,
-                    message_id=update.message.reply_to_message.message_id
-                )
-                
-                # Add a context message to show this is what the user replied to
-                await context.bot.send_message(
-                    chat_id=OWNER_ID,
-                    text=f"↩️ **User replied to this message:**",
-                    reply_to_message_id=replied_msg.message_id
-                )
+                # Point at the forwarded context so it reads as what the user replied to
+                await send_with_retry(lambda: context.bot.send_message(
+                    chat_id=CFG.owner_id,
+                    text="↩️ **User replied to this message:**",
+                    reply_to_message_id=forwarded[0].message_id
+                ))
             except Exception as e:
-                logger.error(f"Failed to forward replied-to message: {e}")
-        
-        # Forward the actual message that the user sent in the group
-        forwarded_msg = await context.bot.forward_message(
-            chat_id=OWNER_ID,
-            from_chat_id=group_id,
-            message_id=update.message.message_id
-        )
+                logger.error("Failed to send reply context note: %s", e)
         
         # Store mapping for reply functionality - use the forwarded message ID
-        message_mappings[forwarded_msg.message_id] = {
-            'original_group_message_id': update.message.message_id,
-            'sender': update.message.from_user,
+        save_message_mapping(forwarded_msg.message_id, {
+            'original_group_message_id': msg.message_id,
+            # Plain fields rather than the User object, which keeps the whole update alive
+            'sender_id': msg.from_user.id,
+            'sender_username': msg.from_user.username,
+            'sender_first_name': msg.from_user.first_name,
             'group_id': group_id
-        }
+        })
         
         # Also store for reactions - group message to private forwarded message
-        reaction_mappings[f"{group_id}_{update.message.message_id}"] = {
-            "private_chat_id": OWNER_ID,
+        reaction_key = (group_id, msg.message_id)
+        reaction_mappings[reaction_key] = reaction_mapping = {
+            "private_chat_id": CFG.owner_id,
             "private_message_id": forwarded_msg.message_id
         }
+        queue_writes(mappings_collection, [mapping_write("reaction", reaction_key, reaction_mapping)])
         
-        logger.info(f"📩 Forwarded bot-related message from {user_name} in {group_name} ({reason})")
+        logger.info("📩 Forwarded bot-related message from %s in %s (%s)", user_name, group_name, reason)
         
     except Exception as e:
-        logger.error(f"Failed to forward bot-related message to owner: {e}")
+        logger.error("Failed to forward bot-related message to owner: %s", e)
 
 async def handle_message_reaction(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle message reactions in both private and group chats"""
@@ -1110,212 +1489,380 @@ async def handle_message_reaction(update: Update, context: ContextTypes.DEFAULT_
     message_id = update.message_reaction.message_id
     new_reaction = update.message_reaction.new_reaction
     
-    logger.info(f"🔔 Reaction detected: User {user_id}, Chat {chat_id}, Message {message_id}, Reactions: {new_reaction}")
+    logger.debug("🔔 Reaction detected: User %s, Chat %s, Message %s, Reactions: %s", user_id, chat_id, message_id, new_reaction)
     
     # Handle reactions in private chat (from owner)
     if update.message_reaction.chat.type == "private":
-        if not is_owner(user_id):
+        if user_id != CFG.owner_id:
             return
         
-        logger.info(f"👤 Owner reaction in private chat on message {message_id}")
+        logger.debug("👤 Owner reaction in private chat on message %s", message_id)
+        
+        mapping_found = False
         
         # Check if this is a reaction to a forwarded group message (reply)
-        if message_id in message_mappings:
-            mapping = message_mappings[message_id]
+        mapping = await get_message_mapping(message_id)
+        if mapping is not None:
             group_id = mapping['group_id']
             group_message_id = mapping['original_group_message_id']
             
             try:
                 # Set the same reaction in the group on the original message
-                await context.bot.set_message_reaction(
+                await send_with_retry(lambda: context.bot.set_message_reaction(
                     chat_id=group_id,
                     message_id=group_message_id,
                     reaction=new_reaction
-                )
-                logger.info(f"✅ Mirrored reaction from private to group reply: {group_id}_{group_message_id}")
+                ), idempotent=True)
+                logger.info("✅ Mirrored reaction from private to group reply: %s_%s", group_id, group_message_id)
                 update_stats(user_id, "reaction_handled")
+                mapping_found = True
                 
             except Exception as e:
-                logger.error(f"❌ Failed to set reaction in group: {e}")
+                logger.error("❌ Failed to set reaction in group: %s", e)
         
-        # Check if this is a reaction to a message that was sent to groups
-        # Look in group_to_private_mappings for any group messages that correspond to this private message
-        mapping_found = False
-        for key, mapping in group_to_private_mappings.items():
-            if (mapping["private_chat_id"] == chat_id and 
-                mapping["private_message_id"] == message_id):
-                
-                # Extract group_id and group_message_id from key
-                group_id, group_message_id = key.split("_")
-                group_id = int(group_id)
-                group_message_id = int(group_message_id)
+        # Check if this is a reaction to a message that was sent to groups - edit_mappings
+        # already indexes every private message by the group copies made of it
+        group_messages = await get_mapping(edit_mappings, "edit", (chat_id, message_id)) or []
+        for group_msg in group_messages:
+            group_id = group_msg["group_id"]
+            group_message_id = group_msg["group_message_id"]
+            
+            try:
+                # Set the same reaction in the group
+                await send_with_retry(lambda: context.bot.set_message_reaction(
+                    chat_id=group_id,
+                    message_id=group_message_id,
+                    reaction=new_reaction
+                ), idempotent=True)
+                logger.info("✅ Mirrored reaction from private to group message: %s_%s", group_id, group_message_id)
+                update_stats(user_id, "reaction_handled")
+                mapping_found = True
                 
-                try:
-                    # Set the same reaction in the group
-                    await context.bot.set_message_reaction(
-                        chat_id=group_id,
-                        message_id=group_message_id,
-                        reaction=new_reaction
-                    )
-                    logger.info(f"✅ Mirrored reaction from private to group message: {group_id}_{group_message_id}")
-                    update_stats(user_id, "reaction_handled")
-                    mapping_found = True
-                    
-                except Exception as e:
-                    logger.error(f"❌ Failed to set reaction in group for sent message: {e}")
+            except Exception as e:
+                logger.error("❌ Failed to set reaction in group for sent message: %s", e)
         
         if not mapping_found:
-            logger.warning(f"⚠️ No mapping found for private message {chat_id}_{message_id}")
+            logger.warning("⚠️ No mapping found for private message %s_%s", chat_id, message_id)
     
     # Handle reactions in group (from users to bot's messages)
     elif update.message_reaction.chat.type in ["group", "supergroup"]:
-        logger.info(f"👥 User reaction in group {chat_id} on message {message_id}")
+        logger.debug("👥 User reaction in group %s on message %s", chat_id, message_id)
         
         # Check if this is a reaction to a message that we have mapped
         # We don't need to check if the bot sent it - we rely on our mappings
-        owner_connections = get_all_connections(int(OWNER_ID))
+        owner_connections = await get_all_connections(CFG.owner_id)
         if chat_id not in owner_connections:
-            logger.warning(f"⚠️ Group {chat_id} not in connected groups")
+            logger.warning("⚠️ Group %s not in connected groups", chat_id)
             return
         
         reaction_mirrored = False
         
         # Check if this is a reply that we have mapped
-        reaction_key = f"{chat_id}_{message_id}"
-        if reaction_key in reaction_mappings:
-            mapping = reaction_mappings[reaction_key]
+        reaction_key = (chat_id, message_id)
+        mapping = await get_mapping(reaction_mappings, "reaction", reaction_key)
+        if mapping is not None:
             try:
                 # Set the same reaction in private chat
-                await context.bot.set_message_reaction(
+                await send_with_retry(lambda: context.bot.set_message_reaction(
                     chat_id=mapping["private_chat_id"],
                     message_id=mapping["private_message_id"],
                     reaction=new_reaction
-                )
-                logger.info(f"✅ Mirrored reaction from group reply to private: {reaction_key}")
-                update_stats(int(OWNER_ID), "reaction_handled")
+                ), idempotent=True)
+                logger.info("✅ Mirrored reaction from group reply to private: %s", reaction_key)
+                update_stats(CFG.owner_id, "reaction_handled")
                 reaction_mirrored = True
             except Exception as e:
-                logger.error(f"❌ Failed to set reaction in private for reply: {e}")
+                logger.error("❌ Failed to set reaction in private for reply: %s", e)
         
         # Check if this is a regular message we sent to the group
-        group_key = f"{chat_id}_{message_id}"
-        if group_key in group_to_private_mappings:
-            mapping = group_to_private_mappings[group_key]
+        group_key = (chat_id, message_id)
+        mapping = await get_mapping(group_to_private_mappings, "g2p", group_key)
+        if mapping is not None:
             try:
                 # Set the same reaction in private chat
-                await context.bot.set_message_reaction(
+                await send_with_retry(lambda: context.bot.set_message_reaction(
                     chat_id=mapping["private_chat_id"],
                     message_id=mapping["private_message_id"],
                     reaction=new_reaction
-                )
-                logger.info(f"✅ Mirrored reaction from group to private: {group_key}")
-                update_stats(int(OWNER_ID), "reaction_handled")
+                ), idempotent=True)
+                logger.info("✅ Mirrored reaction from group to private: %s", group_key)
+                update_stats(CFG.owner_id, "reaction_handled")
                 reaction_mirrored = True
             except Exception as e:
-                logger.error(f"❌ Failed to set reaction in private for sent message: {e}")
+                logger.error("❌ Failed to set reaction in private for sent message: %s", e)
         
         if not reaction_mirrored:
-            logger.warning(f"⚠️ No mapping found for group message {chat_id}_{message_id}")
+            logger.warning("⚠️ No mapping found for group message %s_%s", chat_id, message_id)
 
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /start command"""
-    # Ignore group messages completely
-    if update.message.chat.type != "private":
-        return
-    
-    # Owner check
-    if not is_owner(update.message.from_user.id):
-        await update.message.reply_text("❌ You are not authorized to use this bot.")
-        return
-    
-    await update.message.reply_text(
-        "🤖 Owner-Only Forward Bot is running!\n\n"
-        "🔧 Available Commands:\n"
-        "• /connect <group_id> - Connect to a group\n"
-        "• /disconnect [group_id] - Disconnect from group(s)\n"
-        "• /stats - Show all connected groups with details\n"
-        "• /botstats - Detailed bot statistics and analytics\n\n"
-        "🔄 Features:\n"
-        "- Send messages and select specific groups to send to\n"
-        "- When someone replies to BOT'S messages in connected groups, I'll forward them to you\n"
-        "- When someone mentions/tags the bot in groups, I'll forward those messages to you\n"
-        "- Reply to those messages and I'll send your response back!\n"
-        "- Edit your messages and I'll update them in groups automatically\n"
-        "- React to messages and I'll mirror reactions in groups\n"
-        "- View detailed group statistics\n"
-        "- MongoDB database for reliable storage\n\n"
-        "⚠️ Note: Only you (the owner) can use this bot."
-    )
-
-# Register handlers
-application.add_handler(CommandHandler("start", start))
-application.add_handler(CommandHandler("connect", connect_command))
-application.add_handler(CommandHandler("disconnect", disconnect_command))
-application.add_handler(CommandHandler("stats", stats_command))
-application.add_handler(CommandHandler("botstats", botstats_command))
-
-# Handle group selection callbacks
-application.add_handler(CallbackQueryHandler(handle_group_selection, pattern="^(select_group_|send_to_selected|select_all|cancel_send)"))
+    await update.effective_message.reply_text(_START_TEXT)
 
 # Handle quick disconnect commands (e.g., /disconnect_123456789)
+_DISCONNECT_RE = re.compile(r'^/disconnect_(-?\d+)$')
+
 async def quick_disconnect(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle quick disconnect commands like /disconnect_123456789"""
-    if update.message.chat.type != "private":
+    match = _DISCONNECT_RE.fullmatch(update.message.text)
+    if not match:
+        await update.message.reply_text("❌ Invalid quick disconnect format!")
         return
+    await do_disconnect(update, int(match.group(1)))
+
+def make_app(token: str) -> Application:
+    """Build the Telegram application and register all handlers"""
+    # Outbound API calls get their own large pool so group fan-out never waits on getUpdates,
+    # and use HTTP/2 so concurrent sends share a few multiplexed connections
+    application = (
+        Application.builder()
+        .token(token)
+        .request(OrjsonRequest(
+            connection_pool_size=64,
+            pool_timeout=30,
+            connect_timeout=10,
+            read_timeout=15,
+            write_timeout=15,
+            http_version="2"
+        ))
+        .get_updates_request(OrjsonRequest(connection_pool_size=4, pool_timeout=30))
+        # Pace calls under Telegram's 30 msg/s global and 20 msg/min per-group limits
+        # instead of bursting into 429s; flood waits that still happen are retried by send_with_retry
+        .rate_limiter(AIORateLimiter(
+            overall_max_rate=28,
+            overall_time_period=1,
+            group_max_rate=20,
+            group_time_period=60
+        ))
+        .concurrent_updates(PerChatUpdateProcessor(256))
+        .build()
+    )
     
-    if not is_owner(update.message.from_user.id):
-        await update.message.reply_text("❌ You are not authorized to use this bot.")
+    # Only the owner's private chat reaches the owner handlers; everything else is dropped at dispatch
+    owner_filter = filters.ChatType.PRIVATE & filters.User(user_id=CFG.owner_id)
+    # New messages only - edits would otherwise reach the first matching handler with update.message unset
+    owner_messages = owner_filter & filters.UpdateType.MESSAGE
+    
+    # Register handlers
+    application.add_handler(CommandHandler("start", start, filters=owner_messages))
+    application.add_handler(CommandHandler("connect", connect_command, filters=owner_messages))
+    application.add_handler(CommandHandler("disconnect", disconnect_command, filters=owner_messages))
+    application.add_handler(CommandHandler("stats", stats_command, filters=owner_messages))
+    application.add_handler(CommandHandler("botstats", botstats_command, filters=owner_messages))
+    application.add_handler(CommandHandler("verbose", verbose_command, filters=owner_messages))
+    
+    # Handle group selection callbacks
+    application.add_handler(CallbackQueryHandler(handle_group_selection, pattern="^(select_group_|send_to_selected|select_all|cancel_send)"))
+    
+    application.add_handler(MessageHandler(
+        filters.Regex(_DISCONNECT_RE) & owner_messages,
+        quick_disconnect
+    ))
+    
+    # Handle private messages from owner
+    application.add_handler(MessageHandler(
+        owner_messages & ~filters.COMMAND,
+        handle_private_message
+    ))
+    
+    # Handle edited private messages from owner
+    application.add_handler(MessageHandler(
+        owner_filter & filters.UpdateType.EDITED_MESSAGE & filters.TEXT,
+        handle_private_edit
+    ))
+    
+    # Handle ONLY group messages that are replies to bot OR mention the bot
+    application.add_handler(MessageHandler(
+        filters.ChatType.GROUPS & filters.UpdateType.MESSAGE & ~filters.COMMAND,
+        handle_bot_related_group_messages
+    ))
+    
+    # Handle message reactions with dedicated handler
+    application.add_handler(MessageReactionHandler(handle_message_reaction))
+    
+    return application
+
+# Lets aiohttp route handlers reach the Telegram application
+APPLICATION_KEY = web.AppKey("application", Application)
+
+async def health_check(request: web.Request) -> web.Response:
+    """Health check served on the bot's event loop"""
+    return web.Response(text="🤖 Bot is running! Only the owner can use me.")
+
+async def telegram_webhook(request: web.Request) -> web.Response:
+    """Receive an update pushed by Telegram and hand it to the application"""
+    application = request.app[APPLICATION_KEY]
+    if CFG.webhook_secret and not hmac.compare_digest(
+        request.headers.get("X-Telegram-Bot-Api-Secret-Token", ""), CFG.webhook_secret
+    ):
+        return web.Response(status=403)
+    try:
+        data = orjson.loads(await request.read())
+    except ValueError as e:
+        logger.warning("Rejected webhook request with a malformed body: %s", e)
+        return web.Response(status=400)
+    await application.update_queue.put(Update.de_json(data, application.bot))
+    return web.Response()
+
+async def check_mongo() -> None:
+    """Fail fast at startup if MongoDB is unreachable"""
+    try:
+        await client.admin.command('ping')
+        logger.info("✅ MongoDB connection successful")
+    except Exception as e:
+        logger.error("❌ MongoDB connection failed: %s", e)
+        raise
+
+async def backfill_stats_totals(owner_id: int) -> None:
+    """Seed the all-time totals from the daily stats the first time they are needed"""
+    if await stats_totals_collection.count_documents({"owner_id": owner_id}, limit=1):
         return
+    pipeline = [
+        {"$match": {"owner_id": owner_id}},
+        {"$group": {
+            "_id": None,
+            "total_messages": {"$sum": "$messages_sent"},
+            "total_replies": {"$sum": "$replies_handled"},
+            "total_connections_added": {"$sum": "$connections_added"},
+            "total_connections_removed": {"$sum": "$connections_removed"},
+            "total_reactions": {"$sum": "$reactions_handled"},
+            "total_edits": {"$sum": "$edits_handled"}
+        }}
+    ]
+    totals = await stats_collection.aggregate(pipeline).to_list(length=1)
+    if totals:
+        totals[0].pop("_id")
+        await stats_totals_collection.update_one(
+            {"owner_id": owner_id},
+            {"$setOnInsert": totals[0]},
+            upsert=True
+        )
+        logger.info("📊 Backfilled all-time stats totals")
+
+async def load_settings(owner_id: int) -> None:
+    """Restore the owner's saved preferences"""
+    global verbose_confirmations
+    settings = await settings_collection.find_one({"owner_id": owner_id}) or {}
+    verbose_confirmations = settings.get("verbose", False)
+
+async def load_mappings() -> None:
+    """Reload the newest persisted mappings into memory, so routing survives a restart without lookups"""
+    caches = {"g2p": group_to_private_mappings, "edit": edit_mappings, "reaction": reaction_mappings}
+    docs, recent = await asyncio.gather(
+        mappings_collection.find({}, {"value": 1}).sort("created_at", -1).to_list(length=MESSAGE_MAPPINGS_MAX * len(caches)),
+        message_mappings_collection.find({}, {"created_at": 0}).sort("created_at", -1).to_list(length=MESSAGE_MAPPINGS_MAX)
+    )
     
-    command = update.message.text[1:]  # Remove the leading '/'
-    if command.startswith("disconnect_"):
+    # Oldest first, so the caches evict in the same order they would have before the restart
+    for doc in reversed(docs):
+        kind, _, key = doc["_id"].partition(":")
+        chat_id, _, message_id = key.rpartition("_")
+        caches[kind][(int(chat_id), int(message_id))] = doc["value"]
+    for doc in reversed(recent):
+        message_mappings[doc.pop("_id")] = doc
+    logger.info("📝 Restored %s message mappings", len(docs) + len(recent))
+
+async def ensure_indexes() -> None:
+    """Create the indexes the hot-path queries rely on (no-op if they already exist)"""
+    indexes = [
+        (connections_collection, [("owner_id", 1), ("group_id", 1)], {"unique": True}),
+        # Serves the active-connections query; group_id also covers the keys it returns
+        (connections_collection, [("owner_id", 1), ("is_active", 1), ("group_id", 1)], {}),
+        (stats_collection, [("owner_id", 1), ("date", 1)], {"unique": True}),
+        (stats_collection, [("date", 1)], {"expireAfterSeconds": STATS_RETENTION_SECONDS}),
+        (stats_totals_collection, [("owner_id", 1)], {"unique": True}),
+        (message_mappings_collection, [("created_at", 1)], {"expireAfterSeconds": MESSAGE_MAPPINGS_TTL}),
+        (mappings_collection, [("created_at", 1)], {"expireAfterSeconds": MESSAGE_MAPPINGS_TTL})
+    ]
+    # Each index on its own, so one failure doesn't leave the rest uncreated
+    for collection, keys, options in indexes:
         try:
-            group_id = int(command.split("_")[1])
-            # Set the group_id in context args for disconnect_command
-            context.args = [str(group_id)]
-            await disconnect_command(update, context)
-        except (ValueError, IndexError):
-            await update.message.reply_text("❌ Invalid quick disconnect format!")
-
-application.add_handler(MessageHandler(
-    filters.Regex(r'^/disconnect_\-?\d+$') & filters.ChatType.PRIVATE,
-    quick_disconnect
-))
-
-# Handle private messages from owner
-application.add_handler(MessageHandler(
-    filters.ChatType.PRIVATE & ~filters.COMMAND,
-    handle_private_message
-))
-
-# Handle edited private messages from owner - SIMPLIFIED FILTER
-application.add_handler(MessageHandler(
-    filters.ChatType.PRIVATE & filters.TEXT,
-    handle_private_edit
-))
-
-# Handle ONLY group messages that are replies to bot OR mention the bot
-application.add_handler(MessageHandler(
-    filters.ChatType.GROUPS & ~filters.COMMAND,
-    handle_bot_related_group_messages
-))
-
-# Handle message reactions with dedicated handler
-application.add_handler(MessageReactionHandler(handle_message_reaction))
+            await collection.create_index(keys, **options)
+        except Exception as e:
+            # Pre-existing duplicate documents block a unique index; the bot still works without it
+            logger.warning("Could not create index %s on %s: %s", keys, collection.name, e)
+    
+    # Superseded by the (owner_id, is_active, group_id) index above
+    try:
+        await connections_collection.drop_index([("owner_id", 1), ("is_active", 1)])
+    except Exception:
+        pass
+
+async def main():
+    """Run the bot and the health check server on a single event loop"""
+    await check_mongo()
+    # Totals must be seeded before the TTL index starts expiring the daily documents
+    await backfill_stats_totals(CFG.owner_id)
+    await ensure_indexes()
+    await load_settings(CFG.owner_id)
+    await load_mappings()
+    # Warm the connections cache so the first messages don't wait on MongoDB
+    await get_all_connections(CFG.owner_id)
+    application = make_app(CFG.token)
+    web_app = web.Application()
+    web_app[APPLICATION_KEY] = application
+    web_app.router.add_get("/", health_check)
+    if CFG.webhook_url:
+        web_app.router.add_post(f"/{CFG.token}", telegram_webhook)
+    # Health probes arrive every few seconds; don't write an access log line for each one
+    runner = web.AppRunner(web_app, access_log=None)
+    
+    stop_event = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        try:
+            loop.add_signal_handler(sig, stop_event.set)
+        except NotImplementedError:
+            # Windows event loops have no add_signal_handler - use a plain handler that
+            # hands the stop back to the loop thread
+            signal.signal(sig, lambda signum, frame: loop.call_soon_threadsafe(stop_event.set))
+    
+    async with application:
+        await application.start()
+        # Listen before registering the webhook, so Telegram's first pushes find the port open
+        await runner.setup()
+        # A deep accept queue absorbs deploy-time probe bursts. No SO_REUSEPORT: a second
+        # instance must fail to bind rather than quietly split updates with this one
+        await web.TCPSite(runner, "0.0.0.0", CFG.port, backlog=2048).start()
+        logger.info("Health check listening on port %s", CFG.port)
+        if CFG.webhook_url:
+            logger.info("Starting Telegram bot in webhook mode...")
+            await application.bot.set_webhook(
+                url=f"{CFG.webhook_url}/{CFG.token}",
+                allowed_updates=Update.ALL_TYPES,
+                secret_token=CFG.webhook_secret or None
+            )
+        else:
+            logger.info("Starting Telegram bot in polling mode...")
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        refresh_task = asyncio.create_task(refresh_connections_periodically(CFG.owner_id))
+        stats_task = asyncio.create_task(flush_stats_periodically())
+        writes_task = asyncio.create_task(flush_writes_periodically())
+        try:
+            await stop_event.wait()
+        finally:
+            refresh_task.cancel()
+            # Wake the flush loops so they finish their current write and return
+            flushers_stopping.set()
+            stats_dirty.set()
+            writes_dirty.set()
+            await asyncio.gather(stats_task, writes_task, return_exceptions=True)
+            await runner.cleanup()
+            if application.updater.running:
+                await application.updater.stop()
+            await application.stop()
+            # Write whatever the handlers counted or mapped since the last flush
+            await asyncio.gather(flush_stats(), flush_writes())
+            client.close()
 
 def start_bot():
-    """Start Telegram bot in polling mode"""
-    logger.info("Starting Telegram bot in polling mode...")
-    logger.info(f"Owner ID: {OWNER_ID}")
-    logger.info(f"MongoDB URI: {MONGO_URI}")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    """Start Telegram bot in webhook mode, or polling mode if no WEBHOOK_URL is set"""
+    logger.info("Owner ID: %s", CFG.owner_id)
+    logger.info("MongoDB URI: %s", CFG.mongo_uri)
+    if uvloop is not None:
+        uvloop.run(main())
+    else:
+        asyncio.run(main())
 
 if __name__ == "__main__":
-    # Start Flask in a background thread
-    flask_thread = threading.Thread(target=run_flask)
-    flask_thread.daemon = True
-    flask_thread.start()
-    
-    # Start bot in main thread
     logger.info("Starting bot...")
-    start_bot()
\ No newline at end of file
+    start_bot()